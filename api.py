@@ -0,0 +1,259 @@
+"""
+Read-only HTTP API over the processed dataset, for tools that need seller
+totals without rendering the dashboard.
+
+The app starts it in a background thread when DASHBOARD_API_PORT is set; it
+can also run on its own:
+
+    python api.py --port 8502
+
+Endpoints (GET):
+    /api/version                    dataset version, load time and row count
+    /api/sellers                    processed rows; ?nivel=&month=&seller=&region=&offset=&limit=
+    /api/aggregates                 per-nivel x per-month sums; ?nivel=&month=
+    /api/niveles                    annual totals and goals per nivel; ?nivel=
+    /api/ranks                      month-by-month rank history; ?nivel=&month=&seller=&region=&offset=&limit=
+    /api/perf                       stage timings and counters of this process (perf.stats())
+
+Add ?format=arrow for an Arrow IPC stream instead of JSON. Responses carry an
+ETag (data version + query) and honour If-None-Match; bodies are gzipped
+when the client accepts it.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pyarrow as pa
+
+import perf
+from tables import monthly_goal_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+# Smaller bodies are sent uncompressed
+GZIP_MIN_BYTES = 1024
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+class ApiError(Exception):
+    """Client error reported as a JSON body with an HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(params, name, default, maximum=None):
+    try:
+        value = int(params.pop(name, [default])[0])
+    except ValueError:
+        raise ApiError(f"{name} must be an integer")
+    if value < 0:
+        raise ApiError(f"{name} must be >= 0")
+    return min(value, maximum) if maximum is not None else value
+
+
+def _month_param(params, aggregates):
+    month = params.get("month", [None])[0]
+    if month is not None and month not in aggregates.months:
+        raise ApiError(f"unknown month {month!r}; expected one of {aggregates.months}")
+    return month
+
+
+def _seller_positions(df, params):
+    mask = np.ones(len(df), dtype=bool)
+    if "nivel" in params:
+        mask &= df["nivel"].isin(params["nivel"]).to_numpy()
+    if "region" in params and "region" in df.columns:
+        mask &= df["region"].isin(params["region"]).to_numpy()
+    if "seller" in params:
+        query = params["seller"][0]
+        mask &= df["nombre"].str.contains(query, case=False, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def select_sellers(snapshot, params):
+    """Rows of the processed dataset matching the filters, before paging."""
+    df, aggregates = snapshot.df, snapshot.aggregates
+    positions = _seller_positions(df, params)
+    month = _month_param(params, aggregates)
+    if month is None:
+        return df.iloc[positions]
+    return monthly_goal_frame(df, aggregates, month, positions)[0].reset_index()
+
+
+def select_aggregates(snapshot, params):
+    """Per-nivel x per-month volume and purchase sums, in long form."""
+    month = _month_param(params, snapshot.aggregates)
+    return snapshot.query_engine().sums_by_nivel_month(params.get("nivel"), month)
+
+
+def select_ranks(snapshot, params):
+    """Overall and within-nivel rank per seller and month, with the change since the previous month."""
+    df, aggregates = snapshot.df, snapshot.aggregates
+    positions = _seller_positions(df, params)
+    month = _month_param(params, aggregates)
+    months = aggregates.months if month is None else [month]
+    columns = [aggregates.months.index(name) for name in months]
+    labels = df.iloc[np.repeat(positions, len(months))][["region", "nombre", "nivel"] if "region" in df.columns else ["nombre", "nivel"]]
+    return labels.reset_index(drop=True).assign(
+        month=np.tile(months, len(positions)),
+        ranking=aggregates.ranks[np.ix_(positions, columns)].ravel(),
+        ranking_nivel=aggregates.nivel_ranks[np.ix_(positions, columns)].ravel(),
+        cambio=aggregates.rank_delta[np.ix_(positions, columns)].ravel(),
+    )
+
+
+def select_niveles(snapshot, params):
+    totals = snapshot.query_engine().totals_by_nivel(params.get("nivel"))
+    return totals.rename_axis("nivel").reset_index()
+
+
+ENDPOINTS = {
+    "/api/sellers": select_sellers,
+    "/api/aggregates": select_aggregates,
+    "/api/niveles": select_niveles,
+    "/api/ranks": select_ranks,
+}
+
+
+def etag_for(version, path, params):
+    """Validator for a response: the data version plus a digest of the normalized query."""
+    query = json.dumps([path, sorted((key, sorted(values)) for key, values in params.items())])
+    return f'"{version}-{hashlib.sha1(query.encode()).hexdigest()[:12]}"'
+
+
+def encode_frame(frame, fmt, meta):
+    """(body, content type) for a result page."""
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"api": json.dumps(meta).encode()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_MIME
+    rows = frame.to_json(orient="records", force_ascii=False)
+    return f'{json.dumps(meta)[:-1]}, "rows": {rows}}}'.encode(), "application/json; charset=utf-8"
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Request handler bound to a DatasetHolder through the server."""
+
+    server_version = "DashboardAPI/1"
+
+    def do_GET(self):
+        perf.count("api.request")
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/api/perf":
+                return self._send_json(200, perf.stats())
+            snapshot = self.server.holder.snapshot()
+            if url.path == "/api/version":
+                return self._send_json(200, {"version": snapshot.version, "loaded_at": snapshot.loaded_at, "rows": len(snapshot.df)})
+            if url.path not in ENDPOINTS:
+                raise ApiError(f"unknown endpoint {url.path}", status=404)
+            etag = etag_for(snapshot.version, url.path, params)
+            if etag in [tag.strip() for tag in (self.headers.get("If-None-Match") or "").split(",")]:
+                perf.count("api.not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            fmt = params.pop("format", ["json"])[0]
+            if fmt not in ("json", "arrow"):
+                raise ApiError("format must be json or arrow")
+            offset = _int_param(params, "offset", 0)
+            limit = _int_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+            with perf.span(f"api.{url.path.rsplit('/', 1)[-1]}"):
+                result = ENDPOINTS[url.path](snapshot, params)
+                page = result.iloc[offset:offset + limit]
+                meta = {"version": snapshot.version, "total": len(result), "offset": offset, "limit": limit}
+                body, content_type = encode_frame(page, fmt, meta)
+            self._send(200, body, content_type, etag=etag, total=len(result))
+        except ApiError as exc:
+            self._send_json(exc.status, {"error": str(exc)})
+        except Exception as exc:
+            logger.exception("API request %s failed", self.path)
+            self._send_json(500, {"error": str(exc)})
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), "application/json; charset=utf-8")
+
+    def _send(self, status, body, content_type, etag=None, total=None):
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, compresslevel=5)
+            encoding = "gzip"
+        else:
+            encoding = None
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if total is not None:
+            self.send_header("X-Total-Count", str(total))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def start_api_server(holder, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serve the API for `holder` on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.holder = holder
+    server.thread = threading.Thread(target=server.serve_forever, name="dashboard-api", daemon=True)
+    server.thread.start()
+    logger.info("Dashboard API listening on http://%s:%s", host, server.server_port)
+    return server
+
+
+def main(argv=None):
+    from data_sources import source_from_config
+    from data_store import DatasetHolder
+    from snapshot_cache import SnapshotStore
+
+    parser = argparse.ArgumentParser(description="API HTTP de solo lectura para los datos del dashboard.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--interval", type=int, default=600, help="Segundos entre actualizaciones de la fuente")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    holder = DatasetHolder(source_from_config(), interval=args.interval, store=SnapshotStore()).start()
+    holder.snapshot()
+    server = start_api_server(holder, args.host, args.port)
+    print(f"API en http://{args.host}:{server.server_port}/api/version")
+    try:
+        # Sleep rather than join: after Ctrl-C interrupts a join, shutdown() is interrupted again
+        while server.thread.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        holder.stop()
+
+
+if __name__ == "__main__":
+    main()
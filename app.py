@@ -1,37 +1,113 @@
+import logging
+import os
+import sys
 import streamlit as st
-from data_processing import load_google_sheet_public
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import memory
+import perf
+from data_processing import to_long
+from data_sources import DEFAULT_FETCH_WAIT, source_from_config
+from data_store import DatasetHolder
+import figure_cache
+from history import HistoryStore
+from snapshot_cache import SnapshotStore
+from styles import inject_css
 import importlib
 
-# --- Hide Streamlit menu and footer ---
 st.set_page_config(
     page_title="📊 Dashboard de Ventas", 
     layout="wide",
     initial_sidebar_state="collapsed"
 )
-hide_streamlit_style = """
-    <style>
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    </style>
-"""
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
+# --- Shared CSS (hides Streamlit menu/footer, card shadows) ---
+inject_css()
+
+# --- Page modules, imported only when first selected ---
+PAGE_MODULES = {
+    "Overview": "overview",
+    "Monthly": "monthly",
+    "Yearly": "yearly",
+    "Performance": "performance",
+}
+
+def load_page(page):
+    """Import a page module on demand, timing the first (cold) import."""
+    name = PAGE_MODULES[page]
+    if name in sys.modules:
+        return sys.modules[name]
+    with perf.span(f"import.{name}"):
+        return importlib.import_module(name)
 
 # --- Session state for page navigation ---
 if "page" not in st.session_state:
     st.session_state.page = "Overview"
 
-# --- Google Sheet URL ---
-sheet_url = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSQYwheQSWRk8pWFIPHegbpeHGoF3-S5zgkenfq35X1wAC_XBntUgpNkZyOdoZMczJ0wh5CbU7LD-Od/pubhtml"
+# --- Data source (Google Sheet, local file or fixture; see data_sources.source_from_config) ---
+@st.cache_resource
+def get_data_source():
+    return source_from_config()
+
+# --- Multi-year history (SQLite), appended after every refresh ---
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+# --- Shared dataset, persisted to disk and refreshed in the background (stale-while-revalidate) ---
+@st.cache_resource
+def get_dataset_holder():
+    interval = int(os.environ.get("DASHBOARD_REFRESH_SECONDS", "600"))
+    fetch_wait = float(os.environ.get("DASHBOARD_FETCH_WAIT", DEFAULT_FETCH_WAIT))
+    holder = DatasetHolder(get_data_source(), interval=interval, store=SnapshotStore(), fetch_wait=fetch_wait)
+    history = get_history_store()
+
+    def append_history(snapshot):
+        # A merge missing a region would freeze incomplete closed periods; wait for a full fetch
+        failed = [name for name, error in getattr(holder.source, "shard_errors", {}).items() if error is not None]
+        if failed:
+            perf.count("history.append.skipped")
+            logging.getLogger(__name__).warning("History not updated; failed shards: %s", ", ".join(failed))
+            return
+        # The long table is only needed here, so it is built per append rather than kept with the snapshot
+        with perf.span("history.long"):
+            long_df = to_long(snapshot.df)
+        history.append(long_df, snapshot.year)
+
+    holder.subscribe(append_history)
+    holder.subscribe(figure_cache.rollover)
+    # Build the new snapshot's query engine on the refresh thread, not in a session
+    # (a no-op after most incremental refreshes, which patch the previous engine)
+    holder.subscribe(lambda snapshot: snapshot.query_engine())
+    return holder.start()
+
+# --- Optional read-only HTTP API for other tools (set DASHBOARD_API_PORT; see api.py) ---
+@st.cache_resource
+def get_api_server():
+    port = os.environ.get("DASHBOARD_API_PORT")
+    if not port:
+        return None
+    from api import DEFAULT_HOST, start_api_server
+    try:
+        return start_api_server(get_dataset_holder(), os.environ.get("DASHBOARD_API_HOST", DEFAULT_HOST), int(port))
+    except OSError as exc:
+        logging.getLogger(__name__).warning("Dashboard API not started on port %s: %s", port, exc)
+        return None
+
+# --- Admin-only pages: open the app with ?admin=<DASHBOARD_ADMIN_TOKEN> ---
+admin_token = os.environ.get("DASHBOARD_ADMIN_TOKEN")
+is_admin = bool(admin_token) and st.query_params.get("admin") == admin_token
 
 # --- Load data ---
-df, sales_cols, purchase_cols, volume_cols, purchase_cols_dup = load_google_sheet_public(sheet_url)
+holder = get_dataset_holder()
+get_api_server()
+snapshot = holder.snapshot()
+df, sales_cols, purchase_cols, volume_cols, purchase_cols_dup = snapshot.as_tuple()
 
 # --- Botón Actualizar Datos y Navegación ---
-col_refresh, col_overview, col_monthly, col_yearly = st.columns([1, 1, 1, 1])
+col_refresh, col_overview, col_monthly, col_yearly, *col_admin = st.columns([1, 1, 1, 1, 1] if is_admin else [1, 1, 1, 1])
 with col_refresh:
     if st.button("🔄 Actualizar Datos"):
-        st.cache_data.clear()
-        st.rerun()
+        holder.request_refresh()
+        st.toast("Actualizando datos en segundo plano…")
 with col_overview:
     if st.button("📌 Resumen"):
         st.session_state.page = "Overview"
@@ -41,18 +117,50 @@ with col_monthly:
 with col_yearly:
     if st.button("📈 Anual"):
         st.session_state.page = "Yearly"
+if is_admin:
+    with col_admin[0]:
+        if st.button("⏱️ Rendimiento"):
+            st.session_state.page = "Performance"
+
+if holder.is_stale:
+    st.warning("No se pudieron actualizar los datos; mostrando la última versión disponible.")
+failed_shards = [name for name, error in getattr(holder.source, "shard_errors", {}).items() if error is not None]
+if failed_shards:
+    st.warning(f"Regiones sin actualizar: {', '.join(failed_shards)}. Se muestran sus últimos datos disponibles, si los hay.")
+
+# --- Region filter (only for multi-sheet sources) ---
+region = None
+if len(snapshot.regions) > 1:
+    choice = st.selectbox("🌎 Región", ["Todas"] + snapshot.regions, key="region")
+    region = None if choice == "Todas" else choice
+df, aggregates = snapshot.region_view(region)
+queries = snapshot.query_engine(region)
+# The history store holds all regions, so year-over-year views only apply to "Todas"
+history = get_history_store() if region is None else None
 
 st.markdown("---")
 
-# --- Import pages dynamically (top-level files now) ---
-overview = importlib.import_module("overview")
-monthly = importlib.import_module("monthly")
-yearly = importlib.import_module("yearly")
-
-# --- Render selected page ---
-if st.session_state.page == "Overview":
-    overview.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols)
-elif st.session_state.page == "Monthly":
-    monthly.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols)
-elif st.session_state.page == "Yearly":
-    yearly.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols)
+# --- Render selected page (only its module is imported) ---
+page = st.session_state.page
+if page == "Performance" and not is_admin:
+    page = "Overview"
+page_module = load_page(page)
+if page == "Overview":
+    with perf.span("render.overview"):
+        page_module.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols, aggregates=aggregates)
+elif page == "Monthly":
+    with perf.span("render.monthly"):
+        page_module.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols, aggregates=aggregates, history=history, queries=queries)
+elif page == "Yearly":
+    with perf.span("render.yearly"):
+        page_module.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols, aggregates=aggregates, history=history, queries=queries)
+elif page == "Performance":
+    page_module.render(holder)
+
+# --- Per-session memory accounting (admin page) ---
+run_ctx = get_script_run_ctx()
+memory.track_session(st.session_state, run_ctx.session_id if run_ctx else "local")
+
+# --- Periodic JSON stats log line ---
+perf.enable_stats_log()
+perf.log_stats()
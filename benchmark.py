@@ -0,0 +1,185 @@
+"""
+Offline benchmark for the data pipeline and the page renderers.
+
+Generates synthetic sheets in the published sheet's column layout, then times
+CSV parsing, processing, aggregation and each page's render() headlessly
+(Streamlit bare mode, no browser or network). Results are written as JSON so
+runs can be compared before and after a change:
+
+    python benchmark.py --sizes 10 1000 10000 --output bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit import config as st_config
+from streamlit.logger import set_log_level
+
+import perf
+from data_processing import build_aggregates, process_sheet, to_long
+from data_sources import MONTH_NAMES
+from query_engine import QueryEngine
+from schema import read_sheet_csv
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+PAGES = ["overview", "monthly", "yearly"]
+# Modules app.py imports on every cold start, before any page is selected
+APP_CORE_MODULES = ["streamlit", "perf", "data_sources", "data_store", "history", "snapshot_cache", "styles", "figure_cache", "query_engine"]
+
+
+def synthetic_sheet(n_sellers, n_niveles=8, seed=0):
+    """Random sheet with the same columns (and quirks) as the published Google Sheet."""
+    rng = np.random.default_rng(seed)
+    monthly_goal = rng.integers(20, 200, n_sellers) * 1000
+    purchase_goal = (monthly_goal * rng.uniform(0.7, 1.0, n_sellers)).round(-3)
+    data = {
+        "Nombre": [f"Vendedor {i:06d}" for i in range(n_sellers)],
+        "Nivel": [f"Nivel {i}" for i in rng.integers(0, n_niveles, n_sellers)],
+        "Meta Mensual Volumen": monthly_goal,
+        "Meta Compras 2026": purchase_goal * 12,
+        "Meta Compra Mensual": purchase_goal,
+    }
+    for month in MONTH_NAMES:
+        data[f"Volumen {month.capitalize()}"] = (monthly_goal * rng.uniform(0.2, 1.6, n_sellers)).round(2)
+    for month in MONTH_NAMES:
+        # The live sheet spells this column 'Compras Octubr'
+        name = "Compras Octubr" if month == "octubre" else f"Compras {month.capitalize()}"
+        data[name] = (purchase_goal * rng.uniform(0.2, 1.6, n_sellers)).round(2)
+    return pd.DataFrame(data)
+
+
+def _time(func, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def _summary(samples):
+    values = np.asarray(samples) * 1000
+    return {
+        "runs": len(values),
+        "min_ms": round(float(values.min()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def run_size(n_sellers, n_niveles, repeat, pages):
+    """Benchmark every stage for one roster size; returns {stage: summary}."""
+    results = {}
+    raw = synthetic_sheet(n_sellers, n_niveles)
+    csv_bytes = raw.to_csv(index=False).encode()
+
+    parsed, samples = _time(lambda: read_sheet_csv(csv_bytes), repeat)
+    results["parse_csv"] = _summary(samples)
+
+    processed, samples = _time(lambda: process_sheet(parsed.copy()), repeat)
+    results["process_sheet"] = _summary(samples)
+    df, sales_cols, purchase_cols, volume_cols, _ = processed
+
+    aggregates, samples = _time(lambda: build_aggregates(df, volume_cols), repeat)
+    results["build_aggregates"] = _summary(samples)
+    _, samples = _time(lambda: to_long(df), repeat)
+    results["to_long"] = _summary(samples)
+    queries, samples = _time(lambda: QueryEngine(df, "bench"), repeat)
+    results["build_queries"] = _summary(samples)
+
+    # Page renders run in Streamlit bare mode: widgets return their defaults
+    for page in pages:
+        module = __import__(page)
+        # The overview has no filters, so it takes no query engine
+        kwargs = {"aggregates": aggregates} if page == "overview" else {"aggregates": aggregates, "queries": queries}
+        perf.reset()
+        _, samples = _time(
+            lambda: module.render(df, sales_cols, purchase_cols, volume_cols, purchase_cols, **kwargs),
+            repeat,
+        )
+        results[f"render.{page}"] = _summary(samples)
+        for stage, stage_stats in perf.stats()["stages"].items():
+            if not stage.startswith("render."):
+                results[stage] = {"runs": stage_stats["count"], "p50_ms": stage_stats["p50_ms"], "max_ms": stage_stats["max_ms"]}
+    return results
+
+
+def measure_imports(repeat):
+    """Cold import time (fresh interpreter) of the app core and of each page module."""
+    targets = {"app_core": APP_CORE_MODULES}
+    targets.update({page: APP_CORE_MODULES + [page] for page in PAGES})
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, modules in targets.items():
+        code = (
+            "import time; start = time.perf_counter(); "
+            + "; ".join(f"import {module}" for module in modules)
+            + "; print(time.perf_counter() - start)"
+        )
+        samples = [
+            float(subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True).stdout)
+            for _ in range(repeat)
+        ]
+        results[f"import.{name}"] = _summary(samples)
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline de datos y las páginas.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Número de vendedores por corrida")
+    parser.add_argument("--niveles", type=int, default=8, help="Número de niveles distintos")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", nargs="*", default=PAGES, choices=PAGES)
+    parser.add_argument("--no-imports", action="store_true", help="No medir el tiempo de importación en frío")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+    # Bare-mode renders log a "missing ScriptRunContext" warning per widget;
+    # parse the config first so it does not reset the level afterwards
+    st_config.get_option("logger.level")
+    set_log_level("error")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "repeat": args.repeat,
+            "niveles": args.niveles,
+        },
+        "results": {},
+    }
+    if not args.no_imports:
+        print("▶ importación en frío")
+        report["imports"] = measure_imports(args.repeat)
+        for stage, summary in report["imports"].items():
+            print(f"  {stage:<28} p50 {summary['p50_ms']:>10.2f} ms")
+    for n_sellers in args.sizes:
+        print(f"▶ {n_sellers:,} vendedores")
+        results = run_size(n_sellers, args.niveles, args.repeat, args.pages)
+        report["results"][str(n_sellers)] = results
+        for stage, summary in results.items():
+            print(f"  {stage:<28} p50 {summary['p50_ms']:>10.2f} ms")
+
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
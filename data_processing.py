@@ -1,79 +1,316 @@
+import hashlib
+import re
+from datetime import date
+
+import numpy as np
 import pandas as pd
-import streamlit as st
 
-@st.cache_data(ttl=600)
-def load_google_sheet_public(csv_url):
+from schema import (
+    MONTH_NAMES, ValidationReport, canonical_month_names, check_columns, coerce_numeric, month_column_parts,
+    normalize_column,
+)
+
+
+# Goal columns coerced to numbers alongside the monthly columns (plus the sheet's annual goal)
+GOAL_COLS = ["meta mensual volumen", "meta compra mensual"]
+METRICS = ["volumen", "compras"]
+_YEAR_COL_RE = re.compile(r"^meta compras (\d{4})$")
+
+
+def month_columns(columns, metric):
+    """Monthly columns for `metric` present in `columns`, in calendar order."""
+    found = {}
+    for col in columns:
+        parts = month_column_parts(col)
+        if parts and parts[0] == metric:
+            found[parts[1]] = col
+    return [found[month] for month in MONTH_NAMES if month in found]
+
+
+def annual_goal_column(columns):
+    """The sheet's annual purchase goal column ('meta compras YYYY'), or None."""
+    return next((col for col in columns if _YEAR_COL_RE.match(col)), None)
+
+
+def sheet_year(columns, default=None):
+    """Year of a sheet, read from its 'meta compras YYYY' column."""
+    col = annual_goal_column(columns)
+    if col is not None:
+        return int(_YEAR_COL_RE.match(col).group(1))
+    return default if default is not None else date.today().year
+
+
+def _row_sum(df, cols):
+    """
+    Row totals added column by column, so a row sums to the same float
+    whether it is processed alone or with the whole sheet (incremental refresh).
+    """
+    total = np.zeros(len(df))
+    for col in cols:
+        total += df[col].to_numpy(dtype=float)
+    return total
+
+
+def process_sheet(df, report=None):
     """
-    Load a published Google Sheet CSV as a DataFrame
+    Normalize a raw sheet DataFrame
     and calculate initial percentage columns.
+    Fixes and coerced cells are recorded in `report` (a ValidationReport).
     """
-    # Convert /pubhtml to CSV export
-    csv_export_url = csv_url.replace("/pubhtml", "/pub?output=csv")
-    df = pd.read_csv(csv_export_url)
-
-    # Normalize column names to lowercase
-    df.columns = df.columns.str.lower()
-
-    # Ensure numeric columns (only those that exist)
-    numeric_cols = [
-        "meta mensual volumen",
-        "meta compras 2026",
-        "meta compra mensual",
-        "volumen enero",
-        "volumen febrero",
-        "volumen marzo",
-        "volumen abril",
-        "volumen mayo",
-        "volumen junio",
-        "volumen julio",
-        "volumen agosto",
-        "volumen septiembre",
-        "volumen octubre",
-        "volumen noviembre",
-        "volumen diciembre",
-        "compras enero",
-        "compras febrero",
-        "compras marzo",
-        "compras abril",
-        "compras mayo",
-        "compras junio",
-        "compras julio",
-        "compras agosto",
-        "compras septiembre",
-        "compras octubr",
-        "compras noviembre",
-        "compras diciembre",
-    ]
-    existing_numeric_cols = [col for col in numeric_cols if col in df.columns]
-    for col in existing_numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    report = ValidationReport() if report is None else report
+
+    # Normalize column names to lowercase and fix truncated month names
+    df.columns = [normalize_column(col) for col in df.columns]
+    report.renamed_columns = canonical_month_names(list(df.columns))
+    df = df.rename(columns=report.renamed_columns)
+    expected = [f"{metric} {month}" for metric in METRICS for month in MONTH_NAMES]
+    check_columns(list(df.columns), report, expected=expected)
+
+    # Month columns are derived from the data, in calendar order
+    volume_cols = month_columns(df.columns, "volumen")
+    purchase_cols = month_columns(df.columns, "compras")
+    # The annual goal is named after the sheet's year ('meta compras 2025', ...)
+    annual_goal_col = annual_goal_column(df.columns)
+
+    # Ensure numeric columns (only those that exist), in a single pass
+    numeric_cols = [col for col in GOAL_COLS if col in df.columns] + [annual_goal_col] + volume_cols + purchase_cols
+    coerce_numeric(df, numeric_cols, report)
 
     # Calculate percentages
     df["% Meta Volumen"] = (df["volumen enero"] / df["meta mensual volumen"] * 100).round(2)
     df["% Meta Compras"] = (df["compras enero"] / df["meta compra mensual"] * 100).round(2)
 
     # Calculate annual totals
-    volume_cols = [col for col in df.columns if col.startswith("volumen ")]
-    purchase_cols = [col for col in df.columns if col.startswith("compras ")]
-    
-    # Ensure volume and purchase columns are numeric
-    df[volume_cols] = df[volume_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
-    df[purchase_cols] = df[purchase_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
-    
-    df["total_volumen"] = df[volume_cols].sum(axis=1)
-    df["total_compras"] = df[purchase_cols].sum(axis=1)
+    df["total_volumen"] = _row_sum(df, volume_cols)
+    df["total_compras"] = _row_sum(df, purchase_cols)
     
     df["% Meta Volumen Anual"] = (df["total_volumen"] / (df["meta mensual volumen"] * 12) * 100).round(2)
-    df["% Meta Compras Anual"] = (df["total_compras"] / df["meta compras 2026"] * 100).round(2)
+    df["% Meta Compras Anual"] = (df["total_compras"] / df[annual_goal_col] * 100).round(2)
 
     # Define sales & purchase columns
     sales_cols = volume_cols + ["meta mensual volumen", "% Meta Volumen", "total_volumen", "% Meta Volumen Anual"]
-    purchase_cols = purchase_cols + ["meta compra mensual", "% Meta Compras", "meta compras 2026", "total_compras", "% Meta Compras Anual"]
+    purchase_cols = purchase_cols + ["meta compra mensual", "% Meta Compras", annual_goal_col, "total_compras", "% Meta Compras Anual"]
 
     return df, sales_cols, purchase_cols, volume_cols, purchase_cols
 
+
+def to_long(df):
+    """
+    Melt the wide monthly columns into a compact long table
+    (nombre, nivel, month, metric, value) with categorical codes and
+    float32 values; months are ordered categoricals in calendar order.
+    """
+    month_cols = month_columns(df.columns, "volumen") + month_columns(df.columns, "compras")
+    parts = [month_column_parts(col) for col in month_cols]
+    n_rows, n_cols = len(df), len(month_cols)
+
+    month_codes = np.array([MONTH_NAMES.index(month) for _, month in parts], dtype=np.int8)
+    metric_codes = np.array([METRICS.index(metric) for metric, _ in parts], dtype=np.int8)
+    # Factorize once per seller, then repeat the integer codes
+    nombre_codes, nombres = pd.factorize(df["nombre"], sort=True)
+    nivel_codes, niveles = pd.factorize(df["nivel"], sort=True)
+    return pd.DataFrame({
+        "nombre": pd.Categorical.from_codes(np.repeat(nombre_codes, n_cols), categories=nombres),
+        "nivel": pd.Categorical.from_codes(np.repeat(nivel_codes, n_cols), categories=niveles),
+        "month": pd.Categorical.from_codes(np.tile(month_codes, n_rows), categories=MONTH_NAMES, ordered=True),
+        "metric": pd.Categorical.from_codes(np.tile(metric_codes, n_rows), categories=METRICS),
+        "value": df[month_cols].to_numpy(dtype=np.float32).ravel(),
+    })
+
+
+def dataset_version(df, row_hashes=None):
+    """
+    Short content hash of a DataFrame, used to key derived caches.
+    Pass `row_hashes` (hash_pandas_object of `df`) when already computed.
+    """
+    if row_hashes is None:
+        row_hashes = pd.util.hash_pandas_object(df, index=False)
+    digest = hashlib.sha1("|".join(map(str, df.columns)).encode())
+    digest.update(np.asarray(row_hashes).tobytes())
+    return digest.hexdigest()[:16]
+
+
 def filter_data(df, level=None):
     """Filter by Nivel if provided"""
     if level:
         df = df[df["nivel"].isin(level)]
     return df
+
+
+class SalesAggregates:
+    """
+    Compact per-month aggregates built once per data version: per-month
+    seller rankings (overall and within each nivel, with month-over-month
+    rank changes) and goal ratios. Per-nivel sums come from the query layer
+    (query_engine.QueryEngine).
+    """
+
+    def __init__(self, df, volume_cols, version=None):
+        self.version = version
+        self.months = [col.replace("volumen ", "") for col in volume_cols]
+        self.volume_cols = list(volume_cols)
+        self.purchase_cols = [f"compras {month}" for month in self.months]
+
+        nivel = df["nivel"]
+        volume, purchases = self._matrices(df)
+
+        # Niveles in order of first appearance, with their seller counts
+        self.niveles = nivel.unique().tolist()
+        self.nivel_counts = nivel.value_counts(sort=False)
+
+        # Per-seller goal ratios (%), one column per month
+        self.volume_ratio, self.purchase_ratio = self._goal_ratios(df, volume, purchases)
+
+        # Per-month rank order: row positions sorted by descending volume
+        self._nivel_values = nivel.to_numpy()
+        self.rank_order = {
+            month: order for month, order in zip(self.months, np.argsort(-volume, axis=0, kind="stable").T)
+        }
+        self._rank_tables()
+        self._freeze()
+
+    def _rank_tables(self):
+        """
+        Rank lookups derived from `rank_order`: 1-based ranks per seller x
+        month, overall and within the seller's nivel, the change against the
+        previous month (positive = moved up) and per-nivel rank orders.
+        """
+        n, n_months = len(self._nivel_values), len(self.months)
+        orders = np.column_stack(list(self.rank_order.values())) if n_months else np.zeros((n, 0), dtype=np.intp)
+        columns = np.arange(n_months)
+        positions = np.arange(1, n + 1, dtype=np.int32)[:, None]
+        self.ranks = np.empty((n, n_months), dtype=np.int32)
+        self.ranks[orders, columns] = positions
+
+        # Stable sort of every month's order by nivel: each nivel's block keeps its ranking
+        codes, uniques = pd.factorize(self._nivel_values, use_na_sentinel=False)
+        grouped = np.take_along_axis(orders, np.argsort(codes[orders], axis=0, kind="stable"), axis=0)
+        counts = np.bincount(codes, minlength=len(uniques))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int32)
+        self.nivel_ranks = np.empty((n, n_months), dtype=np.int32)
+        self.nivel_ranks[grouped, columns] = positions - np.repeat(starts, counts)[:, None]
+        self.nivel_rank_order = {
+            nivel: {month: grouped[start:start + count, i] for i, month in enumerate(self.months)}
+            for nivel, start, count in zip(uniques, starts, counts)
+        }
+
+        self.rank_delta, self.nivel_rank_delta = (
+            np.concatenate([np.zeros((n, min(n_months, 1)), dtype=np.int32), ranks[:, :-1] - ranks[:, 1:]], axis=1)
+            for ranks in (self.ranks, self.nivel_ranks)
+        )
+
+    def _freeze(self):
+        # Shared by every session: make accidental in-place edits fail loudly
+        rank_orders = [order for orders in self.nivel_rank_order.values() for order in orders.values()]
+        for array in (self.volume_ratio, self.purchase_ratio, *self.rank_order.values(), *rank_orders,
+                      self.ranks, self.nivel_ranks, self.rank_delta, self.nivel_rank_delta):
+            array.setflags(write=False)
+
+    def _matrices(self, df):
+        volume = df[self.volume_cols].to_numpy(dtype=float)
+        purchases = np.column_stack([
+            df[col].to_numpy(dtype=float) if col in df.columns else np.zeros(len(df))
+            for col in self.purchase_cols
+        ]) if self.months else np.zeros((len(df), 0))
+        return volume, purchases
+
+    @staticmethod
+    def _goal_ratios(df, volume, purchases):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volume_goal = df["meta mensual volumen"].to_numpy(dtype=float)[:, None]
+            purchase_goal = df["meta compra mensual"].to_numpy(dtype=float)[:, None]
+            return np.round(volume / volume_goal * 100, 2), np.round(purchases / purchase_goal * 100, 2)
+
+    def updated(self, df, old_df, removed, modified, months, version=None):
+        """
+        Aggregates for `df` derived from these ones after a row-level edit of
+        `old_df` (the frame they were built from). `removed` and `modified`
+        are row positions in `old_df`; kept rows stay in order and rows past
+        them in `df` are new. Only the edited rows are summed and only the
+        rank orders of `months` are re-sorted; the others are renumbered, so
+        `months` must include every month when rows were added.
+        """
+        new = object.__new__(SalesAggregates)
+        new.version = version
+        new.months, new.volume_cols, new.purchase_cols = self.months, self.volume_cols, self.purchase_cols
+
+        keep = np.ones(len(old_df), dtype=bool)
+        keep[removed] = False
+        new_position = np.cumsum(keep) - 1
+        n_kept = int(keep.sum())
+        changed = np.concatenate([new_position[modified], np.arange(n_kept, len(df))]).astype(np.intp)
+        old_rows = old_df.iloc[np.concatenate([removed, modified]).astype(np.intp)]
+        new_rows = df.iloc[changed]
+
+        # Nivel counts: take the edited rows out, put their new values in
+        counts = self.nivel_counts.sub(old_rows["nivel"].value_counts(sort=False), fill_value=0)
+        counts = counts.add(new_rows["nivel"].value_counts(sort=False), fill_value=0)
+        new.nivel_counts = counts[counts > 0].astype(int)
+        new.niveles = [nivel for nivel in self.niveles if nivel in new.nivel_counts.index]
+        new.niveles += [nivel for nivel in new.nivel_counts.index if nivel not in set(new.niveles)]
+
+        # Ratios: drop removed rows, overwrite edited ones, append new ones
+        volume_ratio, purchase_ratio = self._goal_ratios(new_rows, *self._matrices(new_rows))
+        new.volume_ratio, new.purchase_ratio = (
+            np.concatenate([ratio[keep], np.empty((len(df) - n_kept, ratio.shape[1]))])
+            for ratio in (self.volume_ratio, self.purchase_ratio)
+        )
+        new.volume_ratio[changed] = volume_ratio
+        new.purchase_ratio[changed] = purchase_ratio
+
+        # Rank orders: re-sort edited months, renumber the others
+        new._nivel_values = df["nivel"].to_numpy()
+        new.rank_order = {}
+        for month, col in zip(self.months, self.volume_cols):
+            if month in months:
+                new.rank_order[month] = np.argsort(-df[col].to_numpy(dtype=float), kind="stable")
+            else:
+                order = self.rank_order[month]
+                new.rank_order[month] = new_position[order[keep[order]]]
+        new._rank_tables()
+        new._freeze()
+        return new
+
+    def _single_nivel(self, niveles):
+        """The nivel when `niveles` selects exactly one, else None."""
+        if niveles is not None and len(set(niveles)) == 1:
+            nivel = next(iter(niveles))
+            if nivel in self.nivel_rank_order:
+                return nivel
+        return None
+
+    def top_positions(self, month, n=None, niveles=None):
+        """Row positions of the best sellers for `month`, optionally within `niveles`."""
+        nivel = self._single_nivel(niveles)
+        if nivel is not None:
+            order = self.nivel_rank_order[nivel][month]
+        else:
+            order = self.rank_order[month]
+            if niveles is not None and set(niveles) != set(self.niveles):
+                order = order[np.isin(self._nivel_values[order], list(niveles))]
+        return order if n is None else order[:n]
+
+    def rank_deltas(self, month, n=None, niveles=None):
+        """
+        Rank change since the previous month for each seller of
+        `top_positions(month, n, niveles)`, ranked within the same selection
+        (positive = moved up). None for the first month of the sheet.
+        """
+        index = self.months.index(month)
+        if index == 0:
+            return None
+        order = self.top_positions(month, n, niveles)
+        if niveles is None or set(niveles) == set(self.niveles):
+            return self.rank_delta[order, index]
+        if self._single_nivel(niveles) is not None:
+            return self.nivel_rank_delta[order, index]
+        # Several (not all) niveles: rank the previous month within the same selection
+        previous = self.top_positions(self.months[index - 1], niveles=niveles)
+        previous_rank = np.empty(len(self._nivel_values), dtype=np.int32)
+        previous_rank[previous] = np.arange(1, len(previous) + 1)
+        return previous_rank[order] - np.arange(1, len(order) + 1, dtype=np.int32)
+
+
+def build_aggregates(df, volume_cols, version=None):
+    """Build the SalesAggregates for a processed DataFrame (tagged with its data version)."""
+    return SalesAggregates(df, volume_cols, version)
@@ -0,0 +1,366 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import perf
+from schema import MONTH_NAMES, canonical_month_names, normalize_column, read_sheet_csv
+
+logger = logging.getLogger(__name__)
+
+# --- Default published Google Sheet ---
+DEFAULT_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSQYwheQSWRk8pWFIPHegbpeHGoF3-S5zgkenfq35X1wAC_XBntUgpNkZyOdoZMczJ0wh5CbU7LD-Od/pubhtml"
+
+# Column set by ShardedSource to each row's shard (region/branch) name
+REGION_COLUMN = "region"
+
+# Seconds a caller waits on another caller's in-flight fetch of the same source
+DEFAULT_FETCH_WAIT = 60
+
+
+class DataSource(ABC):
+    """Base class for anything that can produce the raw sheet as a DataFrame."""
+
+    kind = "base"
+
+    @property
+    @abstractmethod
+    def cache_key(self):
+        """Stable identifier used to key caches for this source."""
+
+    @abstractmethod
+    def fetch(self):
+        """Return the raw (unprocessed) sheet as a new DataFrame."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.cache_key!r})"
+
+
+class _Flight:
+    """One in-flight call shared by its leader and any waiters."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function and later callers wait (up to `timeout` seconds) for its result
+    instead of starting their own. Counters are '<name>.leader',
+    '<name>.coalesced' and '<name>.timeout'.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def run(self, key, func, timeout=None):
+        """
+        (result, shared) of `func()` for `key`. `shared` is True for waiters,
+        and for the leader when anyone waited on its call.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+
+        if leader:
+            perf.count(f"{self.name}.leader")
+            try:
+                flight.result = func()
+            except BaseException as exc:
+                flight.error = exc
+                raise
+            finally:
+                # No waiter can join once the entry is gone, so `waiters` is final
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result, flight.waiters > 0
+
+        perf.count(f"{self.name}.coalesced")
+        with perf.span(f"{self.name}.wait"):
+            finished = flight.done.wait(timeout)
+        if not finished:
+            perf.count(f"{self.name}.timeout")
+            raise TimeoutError(f"{key}: in-flight call still running after {timeout}s")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+
+# Process-wide: every holder, API server or loader fetching the same source shares one call
+source_flights = SingleFlight("source.fetch")
+
+
+def fetch_coalesced(source, timeout=DEFAULT_FETCH_WAIT):
+    """
+    `source.fetch()`, joining a concurrent fetch of the same source (same
+    cache_key) if one is in flight. A frame that was shared is copied, so
+    every caller still owns the frame it gets.
+    """
+    frame, shared = source_flights.run(source.cache_key, source.fetch, timeout)
+    return frame.copy() if shared else frame
+
+
+class GoogleSheetSource(DataSource):
+    """
+    Published Google Sheet read through its CSV export.
+    Keeps a pooled HTTP session and sends ETag / Last-Modified validators,
+    so an unchanged sheet costs a 304 instead of a download and re-parse.
+    """
+
+    kind = "gsheet"
+
+    def __init__(self, url, timeout=30, pool_size=4):
+        # Convert /pubhtml to CSV export
+        self.url = url.replace("/pubhtml", "/pub?output=csv")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._etag = None
+        self._last_modified = None
+        self._frame = None
+
+    @property
+    def cache_key(self):
+        return f"gsheet:{self.url}"
+
+    def fetch(self):
+        with self._lock:
+            headers = {}
+            if self._frame is not None:
+                if self._etag:
+                    headers["If-None-Match"] = self._etag
+                if self._last_modified:
+                    headers["If-Modified-Since"] = self._last_modified
+
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and self._frame is not None:
+                perf.count("source.http.not_modified")
+                return self._frame.copy()
+            response.raise_for_status()
+            perf.count("source.http.download")
+
+            self._frame = read_sheet_csv(response.content)
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            return self._frame.copy()
+
+
+class LocalFileSource(DataSource):
+    """CSV or Parquet file on disk; re-read only when its mtime or size changes."""
+
+    kind = "file"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._frame = None
+
+    @property
+    def cache_key(self):
+        return f"file:{self.path}"
+
+    def fetch(self):
+        with self._lock:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._frame is None or stamp != self._stamp:
+                if self.path.lower().endswith((".parquet", ".pq")):
+                    self._frame = pd.read_parquet(self.path)
+                else:
+                    with open(self.path, "rb") as fh:
+                        self._frame = read_sheet_csv(fh.read())
+                self._stamp = stamp
+            return self._frame.copy()
+
+
+class FixtureSource(DataSource):
+    """In-memory DataFrame, for local development, benchmarks and tests."""
+
+    kind = "fixture"
+
+    def __init__(self, frame=None, name="sample"):
+        self.frame = sample_sheet() if frame is None else frame
+        self.name = name
+
+    @property
+    def cache_key(self):
+        return f"fixture:{self.name}"
+
+    def fetch(self):
+        return self.frame.copy()
+
+
+def _column_difference(columns, reference):
+    """Why a shard's columns cannot be merged with `reference` (None if they match or there is none)."""
+    if reference is None or set(columns) == set(reference):
+        return None
+    missing = [col for col in reference if col not in columns]
+    extra = [col for col in columns if col not in reference]
+    return f"columns differ from the other shards (missing {missing}, extra {extra})"
+
+
+class ShardedSource(DataSource):
+    """
+    Several sheets (one per region or branch) fetched concurrently and merged
+    into one frame with a 'region' column. Column names are normalized per
+    shard before the merge, and a shard whose columns differ from the others
+    counts as failed. A shard that fails or exceeds `timeout` is served from
+    its last good frame, or left out if it never loaded; the merge fails only
+    when no shard is available.
+    """
+
+    kind = "sharded"
+
+    def __init__(self, shards, timeout=45):
+        self.shards = dict(shards)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.shards)), thread_name_prefix="shard-fetch")
+        self._lock = threading.Lock()
+        self._frames = {}
+        # name -> None if the last fetch succeeded, else the error message
+        self.shard_errors = {}
+
+    @property
+    def cache_key(self):
+        return "sharded:" + ",".join(f"{name}={source.cache_key}" for name, source in self.shards.items())
+
+    def _fetch_shard(self, name, source):
+        with perf.span(f"source.shard.{name}"):
+            frame = source.fetch()
+        # Shards are merged by column name, so 'Compras Octubr' and 'compras octubre' must match
+        frame.columns = [normalize_column(col) for col in frame.columns]
+        frame = frame.rename(columns=canonical_month_names(list(frame.columns)))
+        # Replaces a region column the sheet may already have
+        frame = frame.drop(columns=REGION_COLUMN, errors="ignore")
+        frame.insert(0, REGION_COLUMN, name)
+        return frame
+
+    def fetch(self):
+        with self._lock:
+            futures = {name: self._executor.submit(self._fetch_shard, name, source) for name, source in self.shards.items()}
+            wait(futures.values(), timeout=self.timeout)
+            fresh = {}
+            for name, future in futures.items():
+                if not future.done():
+                    error = f"timeout after {self.timeout}s"
+                elif future.exception() is not None:
+                    error = str(future.exception())
+                else:
+                    frame = future.result()
+                    # The first shard that loaded sets the columns the others must have
+                    reference = next(iter(fresh.values()), None)
+                    error = _column_difference(frame.columns, reference)
+                    if error is None:
+                        fresh[name] = frame.columns
+                        self._frames[name] = frame
+                        self.shard_errors[name] = None
+                        continue
+                self.shard_errors[name] = error
+                perf.count("source.shard.failed")
+                logger.warning("Shard %r failed (%s); %s", name, error,
+                               "serving its last good copy" if name in self._frames else "leaving it out")
+            frames = [self._frames[name] for name in self.shards if name in self._frames]
+            if not frames:
+                raise RuntimeError(f"All shards failed: {self.shard_errors}")
+            return pd.concat(frames, ignore_index=True)
+
+
+def sample_sheet():
+    """Small sheet with the same column layout as the published Google Sheet."""
+    sellers = [
+        ("Juan Carlos Martinez", "Oro", 120000, 1500000, 110000),
+        ("Luisa Parral", "Oro", 110000, 1300000, 100000),
+        ("Cristina Marquez", "Plata", 80000, 900000, 70000),
+        ("Pedro Gomez", "Plata", 75000, 850000, 65000),
+        ("Ana Lopez", "Bronce", 40000, 450000, 35000),
+        ("Miguel Torres", "Bronce", 35000, 400000, 30000),
+        ("Sofia Ramirez", "Oro", 115000, 1400000, 105000),
+        ("Diego Hernandez", "Plata", 70000, 800000, 60000),
+        ("Valeria Castillo", "Plata", 85000, 950000, 75000),
+        ("Jorge Morales", "Bronce", 45000, 500000, 40000),
+        ("Camila Vargas", "Bronce", 30000, 350000, 25000),
+        ("Andres Ruiz", "Oro", 125000, 1550000, 115000),
+    ]
+    rows = []
+    for i, (name, nivel, monthly_goal, annual_purchase_goal, purchase_goal) in enumerate(sellers):
+        row = {
+            "Nombre": name,
+            "Nivel": nivel,
+            "Meta Mensual Volumen": monthly_goal,
+            "Meta Compras 2026": annual_purchase_goal,
+            "Meta Compra Mensual": purchase_goal,
+        }
+        for m, month in enumerate(MONTH_NAMES):
+            factor = 0.6 + ((i * 7 + m * 3) % 9) / 10
+            row[f"Volumen {month.capitalize()}"] = round(monthly_goal * factor, 2)
+            row[f"Compras {month.capitalize()}"] = round(purchase_goal * factor * 0.9, 2)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def source_for_location(location, name="sample"):
+    """Published sheet URL, 'fixture', or a CSV/Parquet path -> DataSource."""
+    if location.startswith(("http://", "https://")):
+        return GoogleSheetSource(location)
+    if location == "fixture":
+        return FixtureSource(name=name)
+    return LocalFileSource(location)
+
+
+def parse_shards(spec):
+    """'Norte=<url>;Sur=/data/sur.csv' -> {'Norte': DataSource, 'Sur': DataSource}."""
+    shards = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        name, sep, location = entry.partition("=")
+        if not sep or not name.strip() or not location.strip():
+            raise ValueError(f"Invalid shard entry {entry!r}, expected name=location")
+        shards[name.strip()] = source_for_location(location.strip(), name.strip())
+    return shards
+
+
+def source_from_config(env=None):
+    """
+    Build the data source selected through environment variables:
+    DASHBOARD_SOURCE = gsheet (default) | file | fixture | sharded
+    DASHBOARD_SHEET_URL = published sheet URL (gsheet)
+    DASHBOARD_SOURCE_PATH = CSV or Parquet path (file)
+    DASHBOARD_SHARDS = 'Region=url-or-path;...' (sharded)
+    DASHBOARD_SHARD_TIMEOUT = seconds to wait for all shards (sharded)
+    """
+    env = os.environ if env is None else env
+    kind = env.get("DASHBOARD_SOURCE", "gsheet").strip().lower()
+    if kind == "gsheet":
+        return GoogleSheetSource(env.get("DASHBOARD_SHEET_URL", DEFAULT_SHEET_URL))
+    if kind == "file":
+        path = env.get("DASHBOARD_SOURCE_PATH")
+        if not path:
+            raise ValueError("DASHBOARD_SOURCE=file requires DASHBOARD_SOURCE_PATH")
+        return LocalFileSource(path)
+    if kind == "fixture":
+        return FixtureSource()
+    if kind == "sharded":
+        shards = parse_shards(env.get("DASHBOARD_SHARDS", ""))
+        if not shards:
+            raise ValueError("DASHBOARD_SOURCE=sharded requires DASHBOARD_SHARDS")
+        return ShardedSource(shards, timeout=float(env.get("DASHBOARD_SHARD_TIMEOUT", "45")))
+    raise ValueError(f"Unknown DASHBOARD_SOURCE: {kind!r}")
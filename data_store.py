@@ -0,0 +1,359 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import perf
+from data_processing import build_aggregates, dataset_version, process_sheet, sheet_year
+from data_sources import DEFAULT_FETCH_WAIT, SingleFlight, fetch_coalesced
+from query_engine import QueryEngine
+from schema import ValidationReport, normalize_column
+
+logger = logging.getLogger(__name__)
+
+# Above this share of edited rows a full rebuild is cheaper than patching
+INCREMENTAL_MAX_FRACTION = 0.5
+
+# Sessions asking for the same snapshot's query engine share one build
+_engine_builds = SingleFlight("query.engine")
+
+
+@dataclass(frozen=True)
+class SnapshotDelta:
+    """What changed between a snapshot and the one it was patched from."""
+
+    previous_version: str
+    added: int
+    removed: int
+    modified: int
+    # Niveles and months whose figures may differ from the previous version
+    niveles: frozenset
+    months: frozenset
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """
+    Immutable, fully processed dataset shared by every session. Pages slice it
+    by row position and never modify it in place; only display slices are copied.
+    """
+
+    df: pd.DataFrame
+    sales_cols: list
+    purchase_cols: list
+    volume_cols: list
+    version: str
+    aggregates: object
+    source_hash: str = ""
+    loaded_at: float = field(default_factory=time.time)
+    validation: ValidationReport = field(default_factory=ValidationReport)
+    # Raw column names and per-row content hashes keyed by seller, for incremental refreshes
+    raw_columns: tuple = ()
+    row_hashes: pd.Series = None
+    delta: SnapshotDelta = None
+    # Per-region (df, aggregates) and query engines, filled lazily by region_view() / query_engine()
+    _views: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def year(self):
+        """Year the sheet belongs to (from its 'meta compras YYYY' column)."""
+        return sheet_year(self.df.columns)
+
+    @property
+    def regions(self):
+        """Shard names of a merged multi-sheet dataset ([] for a single sheet)."""
+        if "region" not in self.df.columns:
+            return []
+        return sorted(self.df["region"].unique())
+
+    def region_view(self, region=None):
+        """(df, aggregates) for one region, or for all rows when region is None."""
+        if region is None:
+            return self.df, self.aggregates
+        view = self._views.get(region)
+        if view is None:
+            # Built once per snapshot; the versioned key keeps figure caches apart
+            df = self.df[self.df["region"] == region].reset_index(drop=True)
+            view = self._views[region] = (df, build_aggregates(df, self.volume_cols, f"{self.version}:{region}"))
+        return view
+
+    def query_engine(self, region=None):
+        """SQL query layer over region_view(region), built once per snapshot and region."""
+        key = ("queries", region)
+        engine = self._views.get(key)
+        if engine is None:
+            def build():
+                df, aggregates = self.region_view(region)
+                return self._views.setdefault(key, QueryEngine(df, aggregates.version))
+            engine, _ = _engine_builds.run((self.version, region), build)
+        return engine
+
+    def as_tuple(self):
+        """(df, sales_cols, purchase_cols, volume_cols, purchase_cols), the shape process_sheet returns."""
+        return self.df, self.sales_cols, self.purchase_cols, self.volume_cols, self.purchase_cols
+
+
+def row_hashes(raw_df):
+    """
+    Content hash of every raw row, indexed by seller name (and region on
+    merged sheets). None if the sheet has no name column.
+    """
+    columns = {normalize_column(col): col for col in raw_df.columns}
+    if "nombre" not in columns:
+        return None
+    keys = [columns[name] for name in ("region", "nombre") if name in columns]
+    index = pd.MultiIndex.from_frame(raw_df[keys]) if len(keys) > 1 else pd.Index(raw_df[keys[0]])
+    return pd.Series(pd.util.hash_pandas_object(raw_df, index=False).to_numpy(), index=index)
+
+
+def build_snapshot(raw_df, source_hash=None, hashes=None):
+    """Process a raw sheet DataFrame into a DatasetSnapshot."""
+    # Taken before process_sheet renames the raw columns in place
+    raw_columns = tuple(raw_df.columns)
+    hashes = row_hashes(raw_df) if hashes is None else hashes
+    if source_hash is None:
+        source_hash = dataset_version(raw_df, hashes)
+    report = ValidationReport()
+    with perf.span("loader.process"):
+        df, sales_cols, purchase_cols, volume_cols, _ = process_sheet(raw_df, report)
+    if not report.ok:
+        logger.warning("Sheet validation: %s", report.summary())
+    version = dataset_version(df)
+    with perf.span("loader.aggregates"):
+        aggregates = build_aggregates(df, volume_cols, version)
+    return DatasetSnapshot(
+        df, sales_cols, purchase_cols, volume_cols, version,
+        aggregates, source_hash, validation=report,
+        raw_columns=raw_columns, row_hashes=hashes,
+    )
+
+
+def update_snapshot(current, raw_df, source_hash, hashes=None):
+    """
+    Patch `current` with a new raw sheet: only added and modified sellers
+    are processed and the aggregates are adjusted by their rows. Returns
+    None when a full rebuild is needed (no row hashes yet, changed columns,
+    duplicate or reordered sellers, or most rows edited).
+    """
+    if current.row_hashes is None or tuple(raw_df.columns) != current.raw_columns:
+        return None
+    hashes = row_hashes(raw_df) if hashes is None else hashes
+    if hashes is None or not hashes.index.is_unique:
+        return None
+    old = current.row_hashes
+
+    # Match sellers by key: position of each old seller in the new sheet (-1 = removed)
+    position = hashes.index.get_indexer(old.index)
+    removed_mask = position == -1
+    kept_position = position[~removed_mask]
+    n_kept = len(kept_position)
+    if not np.array_equal(kept_position, np.arange(n_kept)):
+        # Sellers were moved or inserted mid-sheet; positional aggregates need a rebuild
+        return None
+    modified_mask = ~removed_mask
+    modified_mask[~removed_mask] = hashes.to_numpy()[kept_position] != old.to_numpy()[~removed_mask]
+    removed, modified = np.flatnonzero(removed_mask), np.flatnonzero(modified_mask)
+    n_added = len(hashes) - n_kept
+    n_changed = len(removed) + len(modified) + n_added
+    if n_changed > INCREMENTAL_MAX_FRACTION * max(len(hashes), 1):
+        return None
+
+    # Process only the edited and new rows (in sheet order) and splice them in
+    changed = np.concatenate([position[modified], np.arange(n_kept, len(hashes))]).astype(np.intp)
+    report = ValidationReport()
+    with perf.span("loader.process"):
+        processed = process_sheet(raw_df.iloc[changed].reset_index(drop=True), report)[0]
+    if list(processed.columns) != list(current.df.columns):
+        return None
+    if not report.ok:
+        logger.warning("Sheet validation (edited rows): %s", report.summary())
+    take = np.arange(len(hashes))
+    take[changed] = n_kept + np.arange(len(changed))
+    kept = current.df.iloc[np.flatnonzero(~removed_mask)]
+    df = pd.concat([kept, processed], ignore_index=True).take(take).reset_index(drop=True)
+
+    # Months and niveles touched by the edit
+    old_rows, new_rows = current.df.iloc[modified], processed.iloc[:len(modified)]
+    month_cols = current.aggregates.volume_cols + current.aggregates.purchase_cols
+    niveles = set(old_rows["nivel"]) | set(new_rows["nivel"])
+    niveles |= set(current.df["nivel"].iloc[removed]) | set(processed["nivel"].iloc[len(modified):])
+    differs = (old_rows[month_cols].to_numpy() != new_rows[month_cols].to_numpy()).any(axis=0)
+    edited_months = {col.split(" ", 1)[1] for col, changed_col in zip(month_cols, differs) if changed_col}
+    all_months = set(current.aggregates.months)
+    # Rank orders only need re-sorting where values moved; removals just renumber
+    resort = all_months if n_added else edited_months
+    if len(removed) or n_added or (old_rows["nivel"].to_numpy() != new_rows["nivel"].to_numpy()).any():
+        edited_months = all_months
+    # A month's rank changes (arrows) are measured against the month before it
+    months = current.aggregates.months
+    edited_months = edited_months | {months[i + 1] for i, month in enumerate(months[:-1]) if month in edited_months}
+    delta = SnapshotDelta(current.version, n_added, len(removed), len(modified), frozenset(niveles), frozenset(edited_months))
+
+    version = dataset_version(df)
+    with perf.span("loader.aggregates"):
+        aggregates = current.aggregates.updated(df, current.df, removed, modified, resort, version)
+    snapshot = DatasetSnapshot(
+        df, current.sales_cols, current.purchase_cols, current.volume_cols, version,
+        aggregates, source_hash, validation=report,
+        raw_columns=current.raw_columns, row_hashes=hashes, delta=delta,
+    )
+    engine = current._views.get(("queries", None))
+    if engine is not None and not len(removed):
+        # Every row kept its position: rewrite only the edited and new sellers in the SQL layer
+        snapshot._views[("queries", None)] = engine.updated(df, changed, version)
+    return snapshot
+
+
+def snapshot_from_cache(df, meta):
+    """Rebuild a DatasetSnapshot from a SnapshotStore entry."""
+    return DatasetSnapshot(
+        df, meta["sales_cols"], meta["purchase_cols"], meta["volume_cols"], meta["version"],
+        build_aggregates(df, meta["volume_cols"], meta["version"]), meta["source_hash"], meta["loaded_at"],
+        ValidationReport(**meta.get("validation", {})),
+    )
+
+
+class DatasetHolder:
+    """
+    Process-wide holder with stale-while-revalidate semantics.
+    A background thread reloads the source every `interval` seconds (or when
+    asked to), swaps the new snapshot in atomically and keeps serving the last
+    good snapshot if a fetch fails.
+    With a SnapshotStore, a restart serves the last persisted snapshot
+    immediately and revalidates it in the background.
+    Fetches are coalesced with any concurrent fetch of the same source;
+    callers give up waiting on another caller's load after `fetch_wait` seconds.
+    """
+
+    def __init__(self, source, interval=600, store=None, fetch_wait=DEFAULT_FETCH_WAIT):
+        self.source = source
+        self.interval = interval
+        self.store = store
+        self.fetch_wait = fetch_wait
+        self.last_error = None
+        self.last_attempt_at = None
+        self._snapshot = None
+        self._listeners = []
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Public API ---
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="dataset-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` whenever a new snapshot is swapped in."""
+        self._listeners.append(callback)
+        return callback
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def snapshot(self):
+        """Return the current snapshot, blocking only for the very first load."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            if not self._load_lock.acquire(blocking=False):
+                # Another session is already loading: wait for its snapshot instead of fetching again
+                perf.count("dataset.load.coalesced")
+                if not self._load_lock.acquire(timeout=self.fetch_wait):
+                    perf.count("dataset.load.timeout")
+                    raise TimeoutError(f"Dataset still loading after {self.fetch_wait}s")
+            try:
+                if self._snapshot is None:
+                    cached = self._load_cached()
+                    if cached is not None:
+                        self._install(cached)
+                        self.request_refresh()
+                    else:
+                        self._install(self._load())
+            finally:
+                self._load_lock.release()
+            snapshot = self._snapshot
+        return snapshot
+
+    def request_refresh(self):
+        """Ask the background thread to revalidate now; returns immediately."""
+        self._wake.set()
+
+    def refresh(self):
+        """Revalidate synchronously; returns True if a new snapshot was loaded."""
+        with self._load_lock:
+            try:
+                snapshot = self._load()
+            except Exception as exc:
+                self.last_error = exc
+                perf.count("dataset.refresh.failed")
+                logger.warning("Dataset refresh failed, serving last good snapshot: %s", exc)
+                return False
+            self.last_error = None
+            if snapshot is self._snapshot:
+                # Unchanged data: keep the old snapshot so downstream caches stay warm
+                perf.count("dataset.refresh.unchanged")
+                return False
+            perf.count("dataset.refresh.changed")
+            self._install(snapshot)
+            return True
+
+    @property
+    def is_stale(self):
+        return self.last_error is not None
+
+    # --- Internals ---
+    def _install(self, snapshot):
+        # Single reference assignment: readers see either the old or the new snapshot
+        self._snapshot = snapshot
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("Snapshot listener %r failed", callback)
+
+    def _load(self):
+        self.last_attempt_at = time.time()
+        with perf.span("loader.fetch"):
+            raw_df = fetch_coalesced(self.source, self.fetch_wait)
+        hashes = row_hashes(raw_df)
+        source_hash = dataset_version(raw_df, hashes)
+        current = self._snapshot
+        if current is not None and current.source_hash == source_hash:
+            return current
+        snapshot = None
+        if current is not None:
+            with perf.span("loader.incremental"):
+                snapshot = update_snapshot(current, raw_df, source_hash, hashes)
+        perf.count("dataset.refresh.full" if snapshot is None else "dataset.refresh.incremental")
+        if snapshot is None:
+            snapshot = build_snapshot(raw_df, source_hash, hashes)
+        if self.store is not None:
+            with perf.span("loader.snapshot_save"):
+                self.store.save(self.source.cache_key, snapshot)
+        return snapshot
+
+    def _load_cached(self):
+        if self.store is None:
+            return None
+        with perf.span("loader.snapshot_load"):
+            entry = self.store.load(self.source.cache_key)
+        perf.count("cache.snapshot.miss" if entry is None else "cache.snapshot.hit")
+        if entry is None:
+            return None
+        return snapshot_from_cache(*entry)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.refresh()
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+import perf
+
+DEFAULT_MAXSIZE = 256
+
+
+def filter_key(values):
+    """Order-insensitive, hashable form of a widget selection."""
+    return tuple(sorted(map(str, values))) if values is not None else None
+
+
+class FigureCache:
+    """
+    Process-wide, bounded LRU of built Plotly figures shared by all sessions.
+    Keys start with the data version, so a refreshed dataset never serves a
+    stale figure; invalidate() drops the old version's entries eagerly.
+    Cached figures are shared: callers must not mutate them.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_or_build(self, key, builder):
+        """Return the cached figure for `key`, building it on a miss."""
+        if key[0] is None:
+            # Unversioned data (e.g. pages rendered outside the app) is never cached
+            return builder()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                perf.count("cache.figure.hit")
+                return self._entries[key]
+        perf.count("cache.figure.miss")
+        figure = builder()
+        with self._lock:
+            self._entries[key] = figure
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return figure
+
+    def invalidate(self, keep_version=None):
+        """Drop every entry not built from `keep_version` (all if None)."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] != keep_version]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def carry_over(self, old_version, new_version, unaffected):
+        """Re-key entries of `old_version` for which unaffected(key) holds to `new_version`."""
+        with self._lock:
+            carried = [key for key in self._entries if key[0] == old_version and unaffected(key)]
+            for key in carried:
+                self._entries[(new_version, *key[1:])] = self._entries[key]
+        perf.count("cache.figure.carried", len(carried))
+        return len(carried)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+figure_cache = FigureCache()
+
+
+def unaffected_by(delta):
+    """
+    Key predicate for a SnapshotDelta: a figure survives the edit when its
+    month or its nivel selection (None = all) was not touched.
+    """
+    def unaffected(key):
+        _, _, niveles, month = key[:4]
+        return (month is not None and month not in delta.months) or (
+            niveles is not None and delta.niveles.isdisjoint(niveles)
+        )
+    return unaffected
+
+
+def rollover(snapshot):
+    """Snapshot listener: keep the figures an incremental edit did not touch, drop the rest."""
+    if snapshot.delta is not None:
+        figure_cache.carry_over(snapshot.delta.previous_version, snapshot.version, unaffected_by(snapshot.delta))
+    figure_cache.invalidate(keep_version=snapshot.version)
+
+
+def cached_figure(version, page, niveles, month, builder, *extra):
+    """
+    Shared-cache lookup keyed by (version, page, niveles, month, *extra).
+    Every actual build is counted as 'recompute.<page>'.
+    """
+    def build():
+        perf.count(f"recompute.{page}")
+        return builder()
+
+    return figure_cache.get_or_build((version, page, filter_key(niveles), month, *extra), build)
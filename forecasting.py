@@ -0,0 +1,186 @@
+"""
+End-of-month and end-of-year projections per seller and per nivel.
+
+Two methods, both computed in one vectorized pass over the seller x month
+matrices:
+
+- run-rate: the open month is extrapolated from its elapsed share
+  (month-to-date / fraction of the month gone), and the remaining months
+  repeat the average monthly rate so far;
+- trend: a least-squares line through each seller's closed months projects
+  the open and remaining months (the run-rate is used with fewer than two
+  closed months).
+
+Closed months keep their actual values. Projections depend on the data and
+on today's date, so they are cached per (data version, day).
+"""
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import perf
+from data_processing import annual_goal_column, sheet_year
+from data_sources import MONTH_NAMES
+
+# Forecasts kept (one per data version, region and day)
+CACHE_SIZE = 16
+
+PROJECTED_VOLUME_PCT = "% Proy. Meta Volumen"
+PROJECTED_PURCHASE_PCT = "% Proy. Meta Compras"
+TREND_VOLUME_PCT = "% Proy. Tendencia Volumen"
+
+
+def month_progress(months, year, as_of):
+    """
+    Per sheet month (calendar order): 1.0 for closed months, the elapsed
+    fraction for the open month and 0.0 for months still to come.
+    """
+    numbers = np.array([MONTH_NAMES.index(month) + 1 for month in months])
+    if year != as_of.year:
+        return np.full(len(months), 1.0 if year < as_of.year else 0.0)
+    progress = (numbers < as_of.month).astype(float)
+    progress[numbers == as_of.month] = as_of.day / calendar.monthrange(year, as_of.month)[1]
+    return progress
+
+
+def _pct(values, goals):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.round(values / goals * 100, 2)
+
+
+def _trend_fill(actual, closed, remaining, fallback_rate):
+    """
+    Values for the `remaining` months from a per-row least-squares line
+    through the `closed` months; rows fall back to `fallback_rate` when
+    fewer than two months are closed.
+    """
+    x = np.flatnonzero(closed).astype(float)
+    if len(x) < 2:
+        return np.broadcast_to(fallback_rate[:, None], (len(actual), int(remaining.sum()))).copy()
+    y = actual[:, closed]
+    x_mean = x.mean()
+    slope = (y - y.mean(axis=1, keepdims=True)) @ (x - x_mean) / ((x - x_mean) ** 2).sum()
+    intercept = y.mean(axis=1) - slope * x_mean
+    fitted = intercept[:, None] + slope[:, None] * np.flatnonzero(remaining)[None, :]
+    return np.clip(fitted, 0, None)
+
+
+def project(actual, progress):
+    """
+    (run_rate, trend) seller x month projections of an `actual` matrix,
+    given month_progress(). Closed months are copied as they are.
+    """
+    closed, remaining = progress >= 1, progress < 1
+    open_month = (progress > 0) & remaining
+    run_rate = np.where(closed, actual, 0.0)
+    # Month-to-date extrapolated to the whole month
+    run_rate[:, open_month] = actual[:, open_month] / progress[open_month]
+    elapsed = closed | open_month
+    rate = run_rate[:, elapsed].mean(axis=1) if elapsed.any() else np.zeros(len(actual))
+    future = remaining & ~open_month
+    run_rate[:, future] = rate[:, None]
+
+    trend = np.where(closed, actual, 0.0)
+    # Never below what the open month has already sold
+    trend[:, remaining] = np.maximum(_trend_fill(actual, closed, remaining, rate), actual[:, remaining])
+    return run_rate, trend
+
+
+class Forecast:
+    """
+    Projections for one dataset as of one day. Matrices are seller x month
+    (aggregates.months order); end-of-year values are their row sums.
+    """
+
+    def __init__(self, df, months, as_of=None):
+        self.months = list(months)
+        self.as_of = as_of or date.today()
+        self.progress = month_progress(self.months, sheet_year(df.columns, self.as_of.year), self.as_of)
+
+        volume = df[[f"volumen {month}" for month in self.months]].to_numpy(dtype=float)
+        purchases = np.column_stack([
+            df[f"compras {month}"].to_numpy(dtype=float) if f"compras {month}" in df.columns else np.zeros(len(df))
+            for month in self.months
+        ]) if self.months else np.zeros((len(df), 0))
+        # Missing cells count as no sales
+        volume, purchases = np.nan_to_num(volume), np.nan_to_num(purchases)
+        self.volume, self.volume_trend = project(volume, self.progress)
+        self.purchases, _ = project(purchases, self.progress)
+
+        self.volume_goal = df["meta mensual volumen"].to_numpy(dtype=float)
+        self.purchase_goal = df["meta compra mensual"].to_numpy(dtype=float)
+        self.annual_purchase_goal = df[annual_goal_column(df.columns)].to_numpy(dtype=float)
+        self.eoy_volume = self.volume.sum(axis=1)
+        self.eoy_volume_trend = self.volume_trend.sum(axis=1)
+        self.eoy_purchases = self.purchases.sum(axis=1)
+        self._nivel = df["nivel"].to_numpy()
+        for array in (self.volume, self.volume_trend, self.purchases, self.eoy_volume, self.eoy_volume_trend, self.eoy_purchases):
+            array.setflags(write=False)
+
+    def month_attainment(self, month, positions=None):
+        """{column: projected attainment (%)} of the month's goals for rows `positions`."""
+        rows = slice(None) if positions is None else positions
+        index = self.months.index(month)
+        return {
+            f"{PROJECTED_VOLUME_PCT} {month}": _pct(self.volume[rows, index], self.volume_goal[rows]),
+            f"{PROJECTED_PURCHASE_PCT} {month}": _pct(self.purchases[rows, index], self.purchase_goal[rows]),
+        }
+
+    def annual_attainment(self, positions=None):
+        """{column: projected end-of-year attainment (%)} of the annual goals for rows `positions`."""
+        rows = slice(None) if positions is None else positions
+        annual_volume_goal = self.volume_goal[rows] * 12
+        return {
+            f"{PROJECTED_VOLUME_PCT} Anual": _pct(self.eoy_volume[rows], annual_volume_goal),
+            f"{PROJECTED_PURCHASE_PCT} Anual": _pct(self.eoy_purchases[rows], self.annual_purchase_goal[rows]),
+            f"{TREND_VOLUME_PCT} Anual": _pct(self.eoy_volume_trend[rows], annual_volume_goal),
+        }
+
+    def by_nivel(self, niveles=None):
+        """Projected end-of-year totals and attainment per nivel (both methods)."""
+        codes, uniques = pd.factorize(self._nivel, use_na_sentinel=False)
+        sums = {
+            name: np.bincount(codes, weights=np.nan_to_num(values), minlength=len(uniques))
+            for name, values in (
+                ("proyeccion_volumen", self.eoy_volume),
+                ("tendencia_volumen", self.eoy_volume_trend),
+                ("meta_volumen", self.volume_goal * 12),
+                ("proyeccion_compras", self.eoy_purchases),
+                ("meta_compras", self.annual_purchase_goal),
+            )
+        }
+        table = pd.DataFrame(sums, index=pd.Index(uniques, name="nivel"))
+        table[f"{PROJECTED_VOLUME_PCT} Anual"] = _pct(table["proyeccion_volumen"], table["meta_volumen"])
+        table[f"{TREND_VOLUME_PCT} Anual"] = _pct(table["tendencia_volumen"], table["meta_volumen"])
+        table[f"{PROJECTED_PURCHASE_PCT} Anual"] = _pct(table["proyeccion_compras"], table["meta_compras"])
+        return table if niveles is None else table.loc[table.index.isin(niveles)]
+
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def forecast_for(df, aggregates, as_of=None):
+    """The Forecast for a dataset and its aggregates, built once per (data version, day)."""
+    as_of = as_of or date.today()
+    key = (aggregates.version, as_of)
+    with _lock:
+        # Unversioned data is built every time, as in figure_cache
+        if aggregates.version is not None and key in _cache:
+            _cache.move_to_end(key)
+            perf.count("cache.forecast.hit")
+            return _cache[key]
+    perf.count("cache.forecast.miss")
+    with perf.span("forecast.build"):
+        forecast = Forecast(df, aggregates.months, as_of)
+    if aggregates.version is None:
+        return forecast
+    with _lock:
+        _cache[key] = forecast
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return forecast
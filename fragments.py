@@ -0,0 +1,19 @@
+from functools import wraps
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+def fragment(func):
+    """
+    st.fragment that still runs `func` outside a script run (bare mode in
+    benchmark.py), where Streamlit would silently skip it.
+    """
+    wrapped = st.fragment(func)
+
+    @wraps(func)
+    def call(*args, **kwargs):
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return func(*args, **kwargs)
+        return wrapped(*args, **kwargs)
+    return call
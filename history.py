@@ -0,0 +1,180 @@
+"""
+Multi-year sales history in a local SQLite database.
+
+The loader appends the current sheet after every refresh. Closed periods
+(past years, and past months of the current year) are frozen once written,
+so only the open month is rewritten on each refresh. Sheets from earlier years
+can be imported once from the command line:
+
+    python history.py import 2025 ventas_2025.csv
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+import perf
+from data_processing import process_sheet, to_long
+from data_sources import MONTH_NAMES, GoogleSheetSource, LocalFileSource
+from snapshot_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_HISTORY_PATH = os.path.join(DEFAULT_CACHE_DIR, "history.sqlite3")
+# Query results kept per store, until the database changes
+RESULT_CACHE_SIZE = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    nivel TEXT,
+    value REAL NOT NULL,
+    PRIMARY KEY (year, month, metric, nombre)
+);
+CREATE INDEX IF NOT EXISTS idx_facts_nombre ON facts (nombre, year, month);
+CREATE INDEX IF NOT EXISTS idx_facts_nivel ON facts (nivel, year, month);
+CREATE TABLE IF NOT EXISTS periods (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    frozen INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (year, month)
+);
+"""
+
+
+def _is_closed(year, month, today):
+    return year < today.year or (year == today.year and month < today.month)
+
+
+class HistoryStore:
+    """Year x month x seller facts with incremental, period-frozen appends."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def append(self, long_df, year, today=None):
+        """
+        Write a sheet's long table for `year`. Frozen periods are skipped;
+        open periods are replaced. Returns the months that were written.
+        """
+        today = today or date.today()
+        if long_df.duplicated(["nombre", "month", "metric"]).any():
+            # A merged multi-region sheet can repeat a seller name; store one row per seller
+            long_df = long_df.groupby(["nombre", "month", "metric"], observed=True, as_index=False).agg(
+                nivel=("nivel", "first"), value=("value", "sum"),
+            )
+        with closing(self._connect()) as conn, conn:
+            frozen = {month for (month,) in conn.execute("SELECT month FROM periods WHERE year = ? AND frozen = 1", (year,))}
+            month_numbers = long_df["month"].cat.codes.to_numpy() + 1
+            written = []
+            for month in sorted(set(month_numbers.tolist()) - frozen):
+                rows = long_df[month_numbers == month]
+                conn.execute("DELETE FROM facts WHERE year = ? AND month = ?", (year, month))
+                conn.executemany(
+                    "INSERT INTO facts (year, month, metric, nombre, nivel, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    zip(
+                        [year] * len(rows), [month] * len(rows),
+                        rows["metric"].astype(str), rows["nombre"].astype(str), rows["nivel"].astype(str),
+                        rows["value"].astype(float),
+                    ),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO periods (year, month, frozen, updated_at) VALUES (?, ?, ?, ?)",
+                    (year, month, int(_is_closed(year, month, today)), time.time()),
+                )
+                written.append(month)
+            return written
+
+    def _stamp(self):
+        """Changes whenever any process (the app or an import) writes the database or its WAL."""
+        stamp = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def _query(self, sql, params=()):
+        """
+        Query result, cached until the database changes. Cached frames are
+        shared between sessions: callers must not modify them.
+        """
+        key = (self._stamp(), sql, tuple(params))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                perf.count("cache.history.hit")
+                return self._results[key]
+        perf.count("cache.history.miss")
+        with closing(self._connect()) as conn:
+            result = pd.read_sql_query(sql, conn, params=params)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _filters(years=None, niveles=None, metric=None):
+        clauses, params = [], []
+        for column, values in (("year", years), ("nivel", niveles)):
+            if values is not None:
+                # Sorted, so the same selection in another order hits the result cache
+                values = sorted(values)
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+        if metric is not None:
+            clauses.append("metric = ?")
+            params.append(metric)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def monthly_totals(self, metric="volumen", years=None, niveles=None):
+        """Totals per (year, month) for the selected niveles."""
+        where, params = self._filters(years, niveles, metric=metric)
+        df = self._query(f"SELECT year, month, SUM(value) AS value FROM facts{where} GROUP BY year, month ORDER BY year, month", params)
+        return df.assign(mes=[MONTH_NAMES[m - 1] for m in df["month"]])
+
+    def yearly_totals(self, metric="volumen", niveles=None):
+        """Totals per (year, nivel)."""
+        where, params = self._filters(niveles=niveles, metric=metric)
+        return self._query(f"SELECT year, nivel, SUM(value) AS value FROM facts{where} GROUP BY year, nivel ORDER BY year, nivel", params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importar hojas de años anteriores al histórico.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Importar una hoja (CSV/Parquet o URL publicada) para un año")
+    imp.add_argument("year", type=int)
+    imp.add_argument("source", help="Ruta a CSV/Parquet o URL publicada de Google Sheets")
+    imp.add_argument("--db", default=DEFAULT_HISTORY_PATH)
+    args = parser.parse_args(argv)
+
+    source = GoogleSheetSource(args.source) if args.source.startswith("http") else LocalFileSource(args.source)
+    df = process_sheet(source.fetch())[0]
+    written = HistoryStore(args.db).append(to_long(df), args.year)
+    print(f"{args.year}: {len(written)} meses escritos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import base64
+import io
+import os
+import threading
+import unicodedata
+from functools import lru_cache
+
+import streamlit as st
+from PIL import Image, ImageOps
+
+import perf
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+# Checked in this order when several files share a name
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".jfif"]
+MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".jfif": "image/jpeg"}
+# Cards show 120px avatars; keep 2x for high-density screens
+THUMBNAIL_SIZE = 240
+
+
+def normalize_name(name):
+    """Seller name -> image file stem: lowercase, underscores, no accents."""
+    name_clean = str(name).strip().replace(" ", "_").replace("/", "_").lower()
+    decomposed = unicodedata.normalize("NFKD", name_clean)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+@lru_cache(maxsize=512)
+def _thumbnail_data_uri(path, mtime_ns, size):
+    # mtime_ns is part of the cache key so an edited photo gets a new thumbnail
+    with open(path, "rb") as fh:
+        original = fh.read()
+    with Image.open(io.BytesIO(original)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        # Square crop, scaled down to `size` but never up
+        side = min(size, *image.size)
+        thumb = ImageOps.fit(image, (side, side))
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="JPEG", quality=85, optimize=True)
+    data, mime = buffer.getvalue(), "image/jpeg"
+    if len(data) >= len(original):
+        # Small photos only grow when re-encoded; the avatar's CSS crops them anyway
+        data, mime = original, MIME_TYPES[os.path.splitext(path)[1].lower()]
+    return f"data:{mime};base64," + base64.b64encode(data).decode()
+
+
+class ImageIndex:
+    """
+    Normalized seller name -> profile image, scanned once.
+    Thumbnails are built lazily and kept in an LRU keyed by file mtime;
+    once a thumbnail is warm, rendering a card costs one stat() call.
+    """
+
+    def __init__(self, directory=IMAGE_DIR, size=THUMBNAIL_SIZE):
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+        self._files = {}
+        self.refresh()
+
+    def refresh(self):
+        """Rescan the images directory."""
+        priority = {ext: i for i, ext in enumerate(IMAGE_EXTENSIONS)}
+        found = {}
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    stem, ext = os.path.splitext(entry.name)
+                    ext = ext.lower()
+                    if ext not in priority or not entry.is_file():
+                        continue
+                    key = normalize_name(stem)
+                    if key not in found or priority[ext] < priority[found[key][1]]:
+                        found[key] = (entry.path, ext)
+        with self._lock:
+            self._files = found
+
+    def __len__(self):
+        return len(self._files)
+
+    def data_uri(self, name):
+        """Small JPEG thumbnail as a data URI, or None if there is no photo."""
+        entry = self._files.get(normalize_name(name))
+        if entry is None:
+            return None
+        path, _ = entry
+        misses = _thumbnail_data_uri.cache_info().misses
+        try:
+            # Stat on every call so a replaced photo gets a new thumbnail without a rescan
+            return _thumbnail_data_uri(path, os.stat(path).st_mtime_ns, self.size)
+        except OSError:
+            return None
+        finally:
+            perf.count("cache.thumbnail.miss" if _thumbnail_data_uri.cache_info().misses > misses else "cache.thumbnail.hit")
+
+
+@st.cache_resource
+def get_image_index():
+    """Process-wide image index, built once at startup."""
+    return ImageIndex()
@@ -0,0 +1,236 @@
+"""
+Headless load test: N concurrent sessions of app.py against a synthetic sheet.
+
+Each simulated viewer is a Streamlit AppTest session running in its own
+thread of this process, so they share the cached dataset, query engines and
+figures exactly like the sessions of one server. Viewers click between
+Resumen/Mensual/Anual and change the month and nivel filters; every
+interaction is one timed rerun. For each session count the report gives
+rerun latency percentiles, throughput, process CPU and RSS:
+
+    python loadtest.py --sessions 1 5 10 20 --actions 20 --sellers 5000
+
+With --max-p95-ms the run fails (exit status 1) when the largest session
+count exceeds that p95 latency, so it can gate regressions. AppTest reruns
+the whole script on every interaction (no fragment-only reruns), so the
+numbers are an upper bound for the widget changes.
+
+Running sessions concurrently relies on a Streamlit internal (the private
+Runtime singleton, see share_test_runtime), so the tool only runs on the
+Streamlit release in STREAMLIT_VERSION; re-check the patch before bumping it.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_SESSIONS = [1, 5, 10, 20]
+NAV_BUTTONS = ["📌 Resumen", "📆 Mensual", "📈 Anual"]
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Streamlit release (major.minor) whose Runtime internals share_test_runtime patches
+STREAMLIT_VERSION = "1.66"
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def prepare_environment(sellers, niveles, workdir):
+    """Point the app at a synthetic sheet and a scratch cache directory (before it is imported)."""
+    from benchmark import synthetic_sheet
+
+    path = os.path.join(workdir, "sheet.csv")
+    synthetic_sheet(sellers, niveles).to_csv(path, index=False)
+    os.environ.update({
+        "DASHBOARD_SOURCE": "file",
+        "DASHBOARD_SOURCE_PATH": path,
+        "DASHBOARD_CACHE_DIR": os.path.join(workdir, "cache"),
+        # No background refresh while measuring
+        "DASHBOARD_REFRESH_SECONDS": "86400",
+    })
+    os.environ.pop("DASHBOARD_API_PORT", None)
+
+
+def share_test_runtime():
+    """
+    AppTest installs a mock Runtime singleton for each run and clears it when
+    the run ends, which breaks runs still going in other threads. Keep
+    serving the most recent one while the sessions overlap.
+    Patches the private Runtime.instance, so other releases are refused.
+    """
+    import streamlit
+    from streamlit.runtime import Runtime
+
+    installed = ".".join(streamlit.__version__.split(".")[:2])
+    if installed != STREAMLIT_VERSION:
+        raise RuntimeError(f"loadtest requires Streamlit {STREAMLIT_VERSION}.x (installed: {streamlit.__version__})")
+
+    original = Runtime.instance.__func__
+    latest = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+            return cls._instance
+        return latest[0] if latest else original(cls)
+
+    Runtime.instance = classmethod(instance)
+
+
+class Viewer:
+    """One simulated session: a random walk over pages and filters."""
+
+    def __init__(self, seed, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(seed)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.latencies = []
+        self.errors = 0
+
+    def _timed(self, action):
+        start = time.perf_counter()
+        try:
+            action()
+            failed = bool(self.app.exception)
+        except Exception:
+            failed = True
+        self.latencies.append(time.perf_counter() - start)
+        self.errors += failed
+
+    def _interactions(self):
+        """Widget changes available on the current page."""
+        app, rng = self.app, self.rng
+        actions = [
+            lambda label=label: next(b for b in app.button if b.label == label).click().run()
+            for label in NAV_BUTTONS
+        ]
+        for box in app.selectbox:
+            if box.label == "Seleccionar Mes":
+                actions.append(lambda box=box: box.select_index(rng.randrange(len(box.options))).run())
+        for select in app.multiselect:
+            if select.label == "Seleccionar Nivel":
+                actions.append(lambda select=select: select.set_value(
+                    rng.sample(select.options, rng.randint(1, len(select.options)))
+                ).run())
+        return actions
+
+    def run(self, n_actions, think_time):
+        self._timed(self.app.run)
+        for _ in range(n_actions):
+            if think_time:
+                time.sleep(self.rng.uniform(0, think_time))
+            self._timed(self.rng.choice(self._interactions()))
+
+
+def run_sessions(n_sessions, n_actions, think_time, timeout, seed=0):
+    """Run `n_sessions` concurrent viewers; returns the summary for this session count."""
+    import memory
+
+    viewers = [Viewer(seed * 1000 + i, timeout) for i in range(n_sessions)]
+    threads = [
+        threading.Thread(target=viewer.run, args=(n_actions, think_time), name=f"viewer-{i}")
+        for i, viewer in enumerate(viewers)
+    ]
+    rss_before, cpu_before, start = memory.process_rss(), _cpu_seconds(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_before
+    rss = memory.process_rss()
+
+    latencies = np.array([latency for viewer in viewers for latency in viewer.latencies]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "sessions": n_sessions,
+        "reruns": int(latencies.size),
+        "errors": sum(viewer.errors for viewer in viewers),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "reruns_per_s": round(latencies.size / wall, 2),
+        # Share of one core; above 100% only where native code runs in parallel
+        "cpu_pct": round(cpu / wall * 100, 1),
+        "rss_mb": round(rss / 2**20, 1),
+        # Includes AppTest's own element trees, so an upper bound for real sessions
+        "rss_delta_per_session_kb": round((rss - rss_before) / n_sessions / 2**10, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga headless de app.py con sesiones concurrentes.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS, help="Sesiones concurrentes por corrida")
+    parser.add_argument("--actions", type=int, default=20, help="Interacciones por sesión")
+    parser.add_argument("--sellers", type=int, default=1000, help="Vendedores en la hoja sintética")
+    parser.add_argument("--niveles", type=int, default=8)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa máxima (s) entre interacciones")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo (s) por rerun")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p95-ms", type=float, help="Falla si el p95 de la mayor cantidad de sesiones lo supera")
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dashboard-loadtest-") as workdir:
+        prepare_environment(args.sellers, args.niveles, workdir)
+        from streamlit import config as st_config
+        from streamlit.logger import set_log_level
+
+        st_config.get_option("logger.level")
+        set_log_level("error")
+        share_test_runtime()
+
+        # Warm-up session: loads the dataset and imports every page once
+        warmup = Viewer(args.seed, args.timeout)
+        warmup.app.run()
+        for label in NAV_BUTTONS:
+            next(b for b in warmup.app.button if b.label == label).click().run()
+
+        results = []
+        print(f"{'sesiones':>8} {'reruns':>7} {'errores':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rerun/s':>8} {'CPU %':>7} {'RSS MB':>8}")
+        for n_sessions in args.sessions:
+            summary = run_sessions(n_sessions, args.actions, args.think_time, args.timeout, args.seed)
+            results.append(summary)
+            print(f"{summary['sessions']:>8} {summary['reruns']:>7} {summary['errors']:>7} {summary['p50_ms']:>9.1f} "
+                  f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['reruns_per_s']:>8.1f} "
+                  f"{summary['cpu_pct']:>7.1f} {summary['rss_mb']:>8.1f}")
+
+    import streamlit
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "streamlit": streamlit.__version__,
+            "sellers": args.sellers,
+            "niveles": args.niveles,
+            "actions": args.actions,
+            "think_time": args.think_time,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Resultados en {args.output}")
+
+    failed = [summary for summary in results if summary["errors"]]
+    if failed:
+        print(f"Reruns con error en {', '.join(str(summary['sessions']) for summary in failed)} sesiones")
+    if args.max_p95_ms is not None and results and results[-1]["p95_ms"] > args.max_p95_ms:
+        print(f"p95 {results[-1]['p95_ms']:.1f} ms > límite {args.max_p95_ms:.1f} ms")
+        raise SystemExit(1)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
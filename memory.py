@@ -0,0 +1,104 @@
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Sessions not seen for this long are dropped from the report
+SESSION_TTL = 3600
+
+
+def process_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(obj, _seen=None):
+    """Approximate bytes held by `obj`, counting shared objects once."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(obj, np.ndarray):
+        # Views report their base's buffer only once
+        return obj.nbytes if obj.base is None else deep_size(obj.base, seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def snapshot_footprint(snapshot):
+    """Bytes of each shared part of a DatasetSnapshot (held once per process)."""
+    return {
+        "df": deep_size(snapshot.df),
+        "aggregates": deep_size(snapshot.aggregates),
+        "row_hashes": deep_size(snapshot.row_hashes) if snapshot.row_hashes is not None else 0,
+    }
+
+
+class SessionTracker:
+    """Last measured session-state size of every recently active session."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def record(self, session_id, size):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = (size, now)
+            expired = [key for key, (_, seen) in self._sessions.items() if now - seen > self.ttl]
+            for key in expired:
+                del self._sessions[key]
+
+    def stats(self):
+        with self._lock:
+            sizes = np.array([size for size, _ in self._sessions.values()], dtype=float)
+        if not len(sizes):
+            return {"sessions": 0, "mean_bytes": 0, "max_bytes": 0, "total_bytes": 0}
+        return {
+            "sessions": len(sizes),
+            "mean_bytes": int(sizes.mean()),
+            "max_bytes": int(sizes.max()),
+            "total_bytes": int(sizes.sum()),
+        }
+
+
+session_tracker = SessionTracker()
+
+
+def track_session(session_state, session_id):
+    """Measure what this session keeps on top of the shared dataset."""
+    size = deep_size(dict(session_state))
+    session_tracker.record(session_id, size)
+    return size
+
+
+def report(snapshot):
+    """Memory report: process RSS, shared dataset parts and per-session overhead."""
+    return {
+        "rss_bytes": process_rss(),
+        "shared": snapshot_footprint(snapshot),
+        "sessions": session_tracker.stats(),
+    }
@@ -1,84 +1,30 @@
+import pandas as pd
 import streamlit as st
 import plotly.express as px
+import perf
+from data_processing import build_aggregates, sheet_year
+from data_sources import MONTH_NAMES
+from figure_cache import cached_figure
+from forecasting import forecast_for
+from fragments import fragment
+from query_engine import QueryEngine
+from seller_chart import render_seller_ranking
+from tables import monthly_goal_frame, render_goal_table
 
-# Custom CSS for shadows and styling
-shadow_css = """
-<style>
-/* Aggressive background color application */
-html, body, #root, .stApp, [data-testid="stApp"], [data-testid="stAppViewContainer"] {
-    background-color: #e9ecef !important;
-    background: #e9ecef !important;
-}
-
-/* Override any Streamlit default backgrounds */
-.stApp > * {
-    background-color: transparent !important;
-}
-
-/* Light gray background for the main container */
-.main .block-container {
-    background-color: #e9ecef !important;
-    padding: 2rem 1rem;
-}
-
-/* Shadow effects for different sections */
-[data-testid="stVerticalBlock"] > [data-testid="column"] {
-    background-color: white;
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04);
-    padding: 20px;
-    margin: 10px 0;
-    border: 1px solid #e9ecef;
-}
-
-[data-testid="stVerticalBlock"] > div:has([data-testid="stMarkdownContainer"]) + div:has([data-testid="stPlotlyChart"]) {
-    background-color: white;
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04);
-    padding: 20px;
-    margin: 15px 0;
-    border: 1px solid #e9ecef;
-}
-
-[data-testid="stDataFrame"] {
-    background-color: white !important;
-    border-radius: 12px !important;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04) !important;
-    border: 1px solid #e9ecef !important;
-    overflow: hidden !important;
-}
-
-[data-testid="stPlotlyChart"] > div {
-    background-color: white !important;
-    border-radius: 12px !important;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04) !important;
-    border: 1px solid #e9ecef !important;
-}
-
-/* Metric cards styling */
-[data-testid="stMetric"] {
-    background-color: white !important;
-    border-radius: 10px !important;
-    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06), 0 1px 2px rgba(0, 0, 0, 0.04) !important;
-    padding: 15px !important;
-    margin: 8px !important;
-    border: 1px solid #e9ecef !important;
-}
-
-/* Title styling */
-h1, h2, h3 {
-    color: #2c3e50 !important;
-    font-weight: 600 !important;
-}
-</style>
-"""
-
-def render(df, sales_cols, purchase_cols, volume_cols, purchase_cols_list):
-    # Apply custom CSS
-    st.markdown(shadow_css, unsafe_allow_html=True)
-    
+def render(df, sales_cols, purchase_cols, volume_cols, purchase_cols_list, aggregates=None, history=None, queries=None):
     st.title("📆 Ventas Mensuales")
+    if aggregates is None:
+        aggregates = build_aggregates(df, volume_cols)
+    if queries is None:
+        queries = QueryEngine(df, aggregates.version)
+    render_sections(df, volume_cols, aggregates, history, queries)
 
+
+# Changing a filter reruns only this fragment, not app.py (data load, navigation).
+# Each section reads the filters it depends on; the trend is keyed by nivel
+# only, so a month change serves it from the figure cache.
+@fragment
+def render_sections(df, volume_cols, aggregates, history, queries):
     # --- Filter by Nivel and Select Month ---
     col1, col2 = st.columns(2)
     with col1:
@@ -88,122 +34,92 @@ def render(df, sales_cols, purchase_cols, volume_cols, purchase_cols_list):
         available_months = [col.replace("volumen ", "") for col in volume_cols]
         selected_month = st.selectbox("Seleccionar Mes", available_months, index=0)
     
-    df_filtered = df[df["nivel"].isin(selected_niveles)]
+    filtered_positions = queries.seller_rows(selected_niveles)
     selected_volume_col = f"volumen {selected_month}"
-    selected_purchase_col = f"compras {selected_month}"
 
     # --- Ventas por Vendedor ---
     st.markdown("<br>", unsafe_allow_html=True)
     st.subheader(f"🏆 Ventas por Vendedor - {selected_month.capitalize()}")
-    all_sellers = df_filtered.sort_values(by=selected_volume_col, ascending=False).copy()
-    
-    # Create horizontal bar chart
-    fig = px.bar(
-        all_sellers, 
-        x=selected_volume_col, 
-        y="nombre", 
-        orientation='h',
-        text=selected_volume_col,
-        title="",
-        labels={selected_volume_col: f"Volumen {selected_month.capitalize()}", "nombre": "Vendedor"}
+    with perf.span("monthly.ranking"):
+        order = aggregates.top_positions(selected_month, niveles=selected_niveles)
+        deltas = aggregates.rank_deltas(selected_month, niveles=selected_niveles)
+    
+    # Top N / paginated ranking: the chart only ever carries the visible window
+    render_seller_ranking(
+        df, order, selected_volume_col, f"Volumen {selected_month.capitalize()}", key="monthly_ranking",
+        cache_key=(aggregates.version, "monthly.ranking", selected_niveles, selected_month), deltas=deltas,
     )
-    fig.update_traces(texttemplate='$%{text:,.2f}', textposition='outside', textfont=dict(color='black'))
-    fig.update_layout(
-        yaxis={'categoryorder':'total ascending', 'tickfont': {'color': 'black'}},
-        margin=dict(l=20, r=20, t=20, b=20),
-        height=max(400, len(all_sellers) * 20)  # Adjust height based on number of sellers
-    )
-    st.plotly_chart(fig, width='stretch')
+    if deltas is not None:
+        st.caption(f"▲/▼: posiciones ganadas o perdidas respecto a {available_months[available_months.index(selected_month) - 1].capitalize()}")
 
     # --- Gráfico de Tendencia Mensual ---
     st.subheader("📈 Tendencia Mensual")
-    
-    # Calculate total monthly volume for all available months
-    monthly_totals = [df_filtered[col].sum() for col in volume_cols]
-    months_cap = [month.capitalize() for month in available_months]
-    
-    # Create time series data
-    import pandas as pd
-    trend_data = pd.DataFrame({
-        'Mes': months_cap,
-        'Volumen Total': monthly_totals,
-        'Fecha': pd.to_datetime([f"2024-{i+1:02d}-01" for i in range(len(available_months))])
-    })
-    
-    # Create line plot with markers
-    fig = px.line(trend_data, x='Fecha', y='Volumen Total', 
-                  title="",
-                  markers=True,
-                  line_shape='linear')
-    
-    # Format the x-axis to show month names
-    fig.update_xaxes(
-        tickformat="%B",
-        tickmode='array',
-        tickvals=trend_data['Fecha'],
-        ticktext=months_cap
-    )
-    
-    # Add data labels on the points
-    fig.update_traces(
-        mode='lines+markers+text',
-        text=[f"${v:,.0f}" for v in monthly_totals],
-        textposition="top center",
-        textfont=dict(size=12)
-    )
-    
-    fig.update_layout(
-        margin=dict(l=20, r=20, t=20, b=20),
-        xaxis_title="",
-        yaxis_title="Volumen Total",
-        showlegend=False
-    )
-    
+    year = sheet_year(df.columns)
+    # Earlier years from the history store, for year-over-year comparison
+    past = history.monthly_totals(niveles=selected_niveles) if history is not None else None
+    if past is not None:
+        past = past[past["year"] != year]
+    years = () if past is None else tuple(past["year"].unique().tolist())
+    
+    def build_trend_figure():
+        # Total monthly volume for all available months, from the query layer
+        monthly_totals = queries.trend_by_month(selected_niveles)["volumen"].tolist()
+        
+        # Create time series data for the sheet's year
+        trend_data = pd.DataFrame({
+            'Año': str(year),
+            'MesNum': [MONTH_NAMES.index(month) + 1 for month in available_months],
+            'Volumen Total': monthly_totals,
+            'Etiqueta': [f"${v:,.0f}" for v in monthly_totals],
+        })
+        
+        if years:
+            trend_data = pd.concat([
+                pd.DataFrame({'Año': past["year"].astype(str), 'MesNum': past["month"], 'Volumen Total': past["value"], 'Etiqueta': ""}),
+                trend_data,
+            ], ignore_index=True)
+        
+        # Create line plot with markers, one line per year
+        fig = px.line(trend_data, x='MesNum', y='Volumen Total', color='Año',
+                      text='Etiqueta',
+                      title="",
+                      markers=True,
+                      line_shape='linear')
+        
+        # Format the x-axis to show month names
+        month_numbers = sorted(trend_data['MesNum'].unique())
+        fig.update_xaxes(
+            tickmode='array',
+            tickvals=month_numbers,
+            ticktext=[MONTH_NAMES[m - 1].capitalize() for m in month_numbers]
+        )
+        
+        # Add data labels on the points
+        fig.update_traces(
+            mode='lines+markers+text',
+            textposition="top center",
+            textfont=dict(size=12)
+        )
+        
+        fig.update_layout(
+            margin=dict(l=20, r=20, t=20, b=20),
+            xaxis_title="",
+            yaxis_title="Volumen Total",
+            legend_title_text="",
+            showlegend=trend_data['Año'].nunique() > 1
+        )
+        return fig
+    
+    # Built once per data version and nivel selection, shared across sessions; history
+    # years are keyed in too, since an import adds lines without a new sheet version
+    with perf.span("monthly.trend"):
+        fig = cached_figure(aggregates.version, "monthly.trend", selected_niveles, None, build_trend_figure, years)
     st.plotly_chart(fig, width='stretch')
 
     # --- Goals Table ---
     st.markdown("### 📊 Rendimiento de Ventas y Compras")
     
-    # Calculate percentages for selected month
-    df_filtered = df_filtered.copy()
-    df_filtered[f"% Meta Volumen {selected_month}"] = (df_filtered[selected_volume_col] / df_filtered["meta mensual volumen"] * 100).round(2)
-    df_filtered[f"% Meta Compras {selected_month}"] = (df_filtered[selected_purchase_col] / df_filtered["meta compra mensual"] * 100).round(2)
-    
-    # Create formatted dataframe for display
-    table_df = df_filtered[["nombre", "nivel", 
-                           "meta mensual volumen", selected_volume_col, f"% Meta Volumen {selected_month}",
-                           "meta compra mensual", selected_purchase_col, f"% Meta Compras {selected_month}"]].copy()
-    
-    # Format monetary columns with $ sign
-    table_df["meta mensual volumen"] = table_df["meta mensual volumen"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df[selected_volume_col] = table_df[selected_volume_col].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df["meta compra mensual"] = table_df["meta compra mensual"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df[selected_purchase_col] = table_df[selected_purchase_col].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    
-    # Format percentage columns with % sign
-    table_df[f"% Meta Volumen {selected_month}"] = table_df[f"% Meta Volumen {selected_month}"].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else x)
-    table_df[f"% Meta Compras {selected_month}"] = table_df[f"% Meta Compras {selected_month}"].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else x)
-    
-    # Set index and display with styling
-    table_df = table_df.set_index("nombre")
-    
-    # Apply conditional styling for percentage columns
-    def style_percentages(val):
-        if isinstance(val, str) and '%' in val:
-            try:
-                # Extract numeric value from percentage string
-                pct = float(val.replace('%', ''))
-                if pct < 50:
-                    return 'background-color: #ffcccc'  # Light red
-                elif pct < 100:
-                    return 'background-color: #ffffcc'  # Light yellow
-                else:
-                    return 'background-color: #ccffcc'  # Light green
-            except ValueError:
-                return ''
-        return ''
-    
-    # Apply styling to the dataframe
-    styled_df = table_df.style.applymap(style_percentages, subset=[f"% Meta Volumen {selected_month}", f"% Meta Compras {selected_month}"])
-    
-    st.dataframe(styled_df)
+    perf.count("recompute.monthly.table")
+    forecast = forecast_for(df, aggregates)
+    table_df, money_cols, pct_cols = monthly_goal_frame(df, aggregates, selected_month, filtered_positions, forecast)
+    render_goal_table(table_df, money_cols=money_cols, pct_cols=pct_cols)
@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Recent samples kept per stage
+RING_SIZE = 512
+# Minimum seconds between two stats log lines
+LOG_INTERVAL = 60
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=RING_SIZE))
+_counters = Counter()
+_last_log = 0.0
+
+
+def record(name, seconds):
+    """Add one timing sample (seconds) for a stage."""
+    with _lock:
+        _samples[name].append(seconds)
+
+
+def count(name, n=1):
+    """Increment a counter, e.g. 'cache.figure.hit'."""
+    with _lock:
+        _counters[name] += n
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def stats():
+    """p50/p95/max per stage (milliseconds) plus all counters."""
+    with _lock:
+        samples = {name: np.fromiter(values, dtype=float) for name, values in _samples.items() if values}
+        counters = dict(_counters)
+    stages = {}
+    for name, values in sorted(samples.items()):
+        p50, p95 = np.percentile(values, [50, 95]) * 1000
+        stages[name] = {
+            "count": int(values.size),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "max_ms": round(float(values.max() * 1000), 2),
+            "last_ms": round(float(values[-1] * 1000), 2),
+        }
+    return {"stages": stages, "counters": dict(sorted(counters.items()))}
+
+
+def enable_stats_log(stream=None):
+    """
+    Give the stats log lines their own handler (stderr by default): under
+    Streamlit, INFO records of non-Streamlit loggers are otherwise dropped.
+    Safe to call more than once.
+    """
+    if any(getattr(handler, "_perf_stats", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler._perf_stats = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def log_stats(force=False):
+    """Emit stats as one JSON log line, at most once every LOG_INTERVAL seconds."""
+    global _last_log
+    now = time.time()
+    if not force and now - _last_log < LOG_INTERVAL:
+        return False
+    _last_log = now
+    logger.info("perf %s", json.dumps(stats()))
+    return True
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _counters.clear()
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+import memory
+import perf
+
+
+def render(holder):
+    st.title("⏱️ Rendimiento")
+
+    # --- Dataset status ---
+    snapshot = holder.snapshot()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Versión de datos", snapshot.version)
+    col2.metric("Cargado", datetime.fromtimestamp(snapshot.loaded_at).strftime("%Y-%m-%d %H:%M:%S"))
+    # An unchanged sheet keeps the loaded time, so also show when the source was last checked
+    last_attempt = holder.last_attempt_at
+    col3.metric("Última consulta", datetime.fromtimestamp(last_attempt).strftime("%Y-%m-%d %H:%M:%S") if last_attempt else "—")
+    col4.metric("Vendedores", f"{len(snapshot.df):,}")
+    if holder.last_error is not None:
+        st.warning(f"Última actualización fallida: {holder.last_error}")
+
+    # --- Shards (multi-sheet sources) ---
+    shard_errors = getattr(holder.source, "shard_errors", None)
+    if shard_errors:
+        st.subheader("Fuentes por región")
+        st.dataframe(pd.DataFrame(
+            {"estado": ["ok" if error is None else error for error in shard_errors.values()]},
+            index=list(shard_errors),
+        ))
+
+    # --- Sheet validation ---
+    report = snapshot.validation
+    st.subheader("Validación de la hoja")
+    if report.ok:
+        st.success(f"Sin problemas en {report.rows:,} filas.")
+    else:
+        st.warning(report.summary())
+    if report.cells:
+        cells = pd.DataFrame.from_dict(report.cells, orient="index")
+        st.dataframe(cells[["missing", "coerced"]].rename(columns={"missing": "vacías", "coerced": "no numéricas"}))
+    if report.rows < len(snapshot.df):
+        st.caption(f"Actualización incremental: se validaron solo las {report.rows:,} filas editadas.")
+    if report.unexpected_columns:
+        st.caption("Columnas no declaradas: " + ", ".join(report.unexpected_columns))
+
+    # --- Memory: one shared dataset plus a small per-session overhead ---
+    st.subheader("Memoria")
+    mem = memory.report(snapshot)
+    sessions = mem["sessions"]
+    shared_total = sum(mem["shared"].values())
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("RSS del proceso", f"{mem['rss_bytes'] / 2**20:,.1f} MB")
+    col2.metric("Dataset compartido", f"{shared_total / 2**20:,.1f} MB")
+    col3.metric("Sesiones activas", sessions["sessions"])
+    col4.metric("Por sesión (máx.)", f"{sessions['max_bytes'] / 2**10:,.1f} KB")
+    st.dataframe(pd.Series({name: size / 2**20 for name, size in mem["shared"].items()}, name="MB"))
+    users = st.number_input("Usuarios concurrentes a estimar", min_value=1, value=50, step=10)
+    estimate = mem["rss_bytes"] + users * sessions["max_bytes"]
+    st.caption(
+        f"Estimación para {users:,} usuarios: {estimate / 2**20:,.1f} MB "
+        "(RSS actual + estado de sesión máximo por usuario; el dataset y las figuras se comparten)."
+    )
+
+    data = perf.stats()
+
+    # --- Per-stage timings ---
+    st.subheader("Tiempos por etapa (ms)")
+    if data["stages"]:
+        stages = pd.DataFrame.from_dict(data["stages"], orient="index").sort_values("p95_ms", ascending=False)
+        st.dataframe(stages)
+    else:
+        st.info("Aún no hay muestras.")
+
+    # --- Cache counters ---
+    st.subheader("Contadores")
+    if data["counters"]:
+        st.dataframe(pd.Series(data["counters"], name="valor"))
+
+    payload = json.dumps({**data, "memory": mem}, indent=2)
+    col_download, col_reset = st.columns(2)
+    with col_download:
+        st.download_button("⬇️ Descargar JSON", payload, file_name="rendimiento.json", mime="application/json")
+    with col_reset:
+        if st.button("Reiniciar métricas"):
+            perf.reset()
+            st.rerun()
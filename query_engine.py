@@ -0,0 +1,228 @@
+"""
+In-process SQL query layer over one processed dataset.
+
+Each DatasetSnapshot (and each region view) gets its own in-memory SQLite
+database, built on first use: a `sellers` table with the per-seller goals
+and totals, and a `facts` table (seller x month, volume and purchases)
+clustered by month and indexed by nivel and seller. Pages call the parameterized queries below instead
+of filtering and grouping the DataFrame themselves.
+
+Every query has a fixed SQL text (list filters go through json_each), so
+sqlite3's per-connection statement cache keeps it prepared, and results are
+cached per engine -- that is, per data version. Cached results are shared
+between sessions: callers must not modify them.
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import perf
+from data_processing import METRICS, annual_goal_column
+from data_sources import MONTH_NAMES
+
+# Results kept per engine (one engine per data version and region)
+RESULT_CACHE_SIZE = 128
+
+# Columns of totals_by_nivel(), followed by the sheet's annual goal column
+NIVEL_TOTAL_COLS = ["total_volumen", "total_compras", "meta mensual volumen", "meta compra mensual"]
+
+SCHEMA = """
+CREATE TABLE sellers (
+    row INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    nivel TEXT,
+    meta_volumen REAL,
+    meta_compra REAL,
+    meta_compras_anual REAL,
+    total_volumen REAL,
+    total_compras REAL
+);
+CREATE TABLE facts (
+    month INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    nivel TEXT,
+    volumen REAL,
+    compras REAL,
+    PRIMARY KEY (month, row)
+) WITHOUT ROWID;
+"""
+
+# Created after the bulk insert, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX idx_sellers_nivel ON sellers (nivel);
+CREATE INDEX idx_sellers_nombre ON sellers (nombre COLLATE NOCASE);
+CREATE INDEX idx_facts_nivel ON facts (nivel, month);
+"""
+
+# `?1 IS NULL` = no nivel filter; otherwise ?1 is a JSON list of niveles
+_NIVEL_FILTER = "(?1 IS NULL OR nivel IN (SELECT value FROM json_each(?1)))"
+
+SQL_SELLER_ROWS = f"""
+SELECT row FROM sellers
+WHERE {_NIVEL_FILTER} AND (?2 IS NULL OR nombre LIKE '%' || ?2 || '%' ESCAPE '\\')
+ORDER BY row
+"""
+
+SQL_TOTALS_BY_NIVEL = f"""
+SELECT nivel, SUM(total_volumen), SUM(total_compras), SUM(meta_volumen), SUM(meta_compra), SUM(meta_compras_anual)
+FROM sellers
+WHERE {_NIVEL_FILTER}
+GROUP BY nivel
+ORDER BY MIN(row)
+"""
+
+SQL_SUMS_BY_NIVEL_MONTH = f"""
+SELECT nivel, month, SUM(volumen), SUM(compras)
+FROM facts
+WHERE {_NIVEL_FILTER} AND (?2 IS NULL OR month = ?2)
+GROUP BY month, nivel
+ORDER BY month, MIN(row)
+"""
+
+SQL_TREND_BY_MONTH = f"""
+SELECT month, SUM(volumen), SUM(compras)
+FROM facts
+WHERE {_NIVEL_FILTER}
+GROUP BY month
+ORDER BY month
+"""
+
+def _niveles_param(niveles):
+    """JSON list for the nivel filter (order-insensitive), or None for all niveles."""
+    return None if niveles is None else json.dumps(sorted(map(str, niveles)))
+
+
+def _like_param(text):
+    """Substring pattern for LIKE with its wildcards escaped, or None."""
+    if not text:
+        return None
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class QueryEngine:
+    """
+    Read-only SQLite copy of a processed DataFrame with cached,
+    parameterized queries. Safe to share between threads.
+    """
+
+    def __init__(self, df, version=None):
+        self.version = version
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._annual_goal_col = annual_goal_column(df.columns)
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False, cached_statements=64)
+        with perf.span("query.build"):
+            self._load(df)
+
+    def _load(self, df):
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._insert(df, np.arange(len(df)))
+            self._conn.executescript(INDEXES)
+            self._conn.execute("ANALYZE")
+
+    def _insert(self, df, positions):
+        """Insert the sellers at row `positions` of df, with their monthly facts."""
+        rows = df.iloc[positions]
+        n = len(rows)
+        nivel = rows["nivel"].astype(str).tolist()
+
+        def column(name):
+            return rows[name].to_numpy(dtype=float) if name in rows.columns else np.full(n, np.nan)
+
+        self._conn.executemany(
+            "INSERT INTO sellers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(
+                positions.tolist(), rows["nombre"].astype(str).tolist(), nivel,
+                column("meta mensual volumen").tolist(), column("meta compra mensual").tolist(),
+                column(self._annual_goal_col).tolist(), column("total_volumen").tolist(), column("total_compras").tolist(),
+            ),
+        )
+        # Inserted in primary-key order (month, row): appends to the clustered table on a full load
+        months = [month for month in MONTH_NAMES if f"volumen {month}" in df.columns]
+        for month in months:
+            self._conn.executemany(
+                "INSERT INTO facts VALUES (?, ?, ?, ?, ?)",
+                zip([MONTH_NAMES.index(month) + 1] * n, positions.tolist(), nivel,
+                    column(f"volumen {month}").tolist(), column(f"compras {month}").tolist()),
+            )
+
+    def updated(self, df, changed, version=None):
+        """
+        Engine for `df` derived from this one after an edit that kept every
+        row in place: only the sellers at row positions `changed` (edited or
+        appended) are rewritten. The database is copied, so this engine stays
+        valid for the previous data version.
+        """
+        new = object.__new__(QueryEngine)
+        new.version = version
+        new._lock = threading.Lock()
+        new._results = OrderedDict()
+        new._annual_goal_col = self._annual_goal_col
+        new._conn = sqlite3.connect(":memory:", check_same_thread=False, cached_statements=64)
+        changed = np.asarray(changed, dtype=np.intp)
+        with perf.span("query.update"):
+            with self._lock:
+                self._conn.backup(new._conn)
+            rows = changed.tolist()
+            months = [MONTH_NAMES.index(month) + 1 for month in MONTH_NAMES if f"volumen {month}" in df.columns]
+            with new._conn:
+                new._conn.executemany("DELETE FROM sellers WHERE row = ?", [(row,) for row in rows])
+                # By primary key: facts are clustered by (month, row)
+                new._conn.executemany("DELETE FROM facts WHERE month = ? AND row = ?", [(month, row) for month in months for row in rows])
+                new._insert(df, changed)
+        return new
+
+    def _cached(self, name, sql, params, convert):
+        """Run a prepared query once per (name, params); later calls hit the result cache."""
+        key = (name, params)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                perf.count("cache.query.hit")
+                return self._results[key]
+            perf.count("cache.query.miss")
+            with perf.span(f"query.{name}"):
+                result = convert(self._conn.execute(sql, params).fetchall())
+            self._results[key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    # --- Queries ---
+    def seller_rows(self, niveles=None, seller=None):
+        """Row positions (ascending) of the sellers in `niveles` whose name contains `seller`."""
+        def convert(records):
+            positions = np.fromiter((row for (row,) in records), dtype=np.intp, count=len(records))
+            positions.setflags(write=False)
+            return positions
+        return self._cached("seller_rows", SQL_SELLER_ROWS, (_niveles_param(niveles), _like_param(seller)), convert)
+
+    def totals_by_nivel(self, niveles=None):
+        """Annual totals and goals per nivel (NIVEL_TOTAL_COLS and the annual goal), indexed by nivel."""
+        def convert(records):
+            return pd.DataFrame.from_records(records, columns=["nivel", *NIVEL_TOTAL_COLS, self._annual_goal_col]).set_index("nivel")
+        return self._cached("totals_by_nivel", SQL_TOTALS_BY_NIVEL, (_niveles_param(niveles),), convert)
+
+    def trend_by_month(self, niveles=None):
+        """Volume and purchase totals per month (calendar order, month names as index) for the selected niveles."""
+        def convert(records):
+            return pd.DataFrame.from_records(
+                [values for _, *values in records], columns=METRICS,
+                index=pd.Index([MONTH_NAMES[month - 1] for month, *_ in records], name="month"),
+            )
+        return self._cached("trend_by_month", SQL_TREND_BY_MONTH, (_niveles_param(niveles),), convert)
+
+    def sums_by_nivel_month(self, niveles=None, month=None):
+        """Volume and purchase sums per nivel and month (one month if given), month by month."""
+        def convert(records):
+            return pd.DataFrame.from_records(
+                [(nivel, MONTH_NAMES[number - 1], *values) for nivel, number, *values in records],
+                columns=["nivel", "month", *METRICS],
+            )
+        params = (_niveles_param(niveles), None if month is None else MONTH_NAMES.index(month) + 1)
+        return self._cached("sums_by_nivel_month", SQL_SUMS_BY_NIVEL_MONTH, params, convert)
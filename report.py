@@ -0,0 +1,237 @@
+"""
+Headless export of the monthly and annual goal tables.
+
+Builds the dataset through the same pipeline as the app (source, schema,
+processing, aggregates), then writes one file per report -- every month and
+the year, for all sellers and for each nivel -- without a browser:
+
+    python report.py --formats csv xlsx html --output reportes
+
+Reports are generated in parallel on a process pool. Each worker streams its
+table to the writer in chunks, and only file paths come back to the parent.
+XLSX needs openpyxl; PNG charts need kaleido.
+"""
+import argparse
+import csv
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+import plotly.express as px
+
+from data_processing import build_aggregates
+from data_sources import source_for_location, source_from_config
+from data_store import build_snapshot
+from images import normalize_name
+from query_engine import QueryEngine
+from seller_chart import seller_bar_figure, top_n_with_others
+from tables import annual_goal_frame, monthly_goal_frame, percentage_styles
+
+FORMATS = ["csv", "xlsx", "html", "png"]
+DEFAULT_FORMATS = ["csv", "html"]
+# Rows handed to a writer at a time
+CHUNK_ROWS = 5000
+# Sellers drawn in report charts (the rest go to 'Otros')
+CHART_TOP_N = 20
+
+
+@dataclass(frozen=True)
+class ReportJob:
+    """One output file: a month (or None for the annual report), a nivel (None = all) and a format."""
+
+    month: object
+    nivel: object
+    fmt: str
+
+    @property
+    def title(self):
+        period = f"Mensual {self.month.capitalize()}" if self.month else "Anual"
+        return f"{period} - {self.nivel}" if self.nivel else period
+
+    def filename(self, year):
+        stem = f"mensual_{self.month}" if self.month else "anual"
+        if self.nivel:
+            stem += f"_{normalize_name(self.nivel)}"
+        return os.path.join(str(year), f"{stem}.{self.fmt}")
+
+
+# --- Worker state: the processed dataset, sent once per worker process ---
+_df = None
+_aggregates = None
+_queries = None
+
+
+def _init_worker(df, volume_cols, version):
+    global _df, _aggregates, _queries
+    _df = df
+    _aggregates = build_aggregates(df, volume_cols, version)
+    _queries = None
+
+
+def _worker_queries():
+    """The worker's query engine, built on its first annual report."""
+    global _queries
+    if _queries is None:
+        _queries = QueryEngine(_df, _aggregates.version)
+    return _queries
+
+
+def _report_frame(job):
+    """(table_df, money_cols, pct_cols, figure builder) for a job."""
+    positions = np.arange(len(_df)) if job.nivel is None else np.flatnonzero(_df["nivel"].to_numpy() == job.nivel)
+    if job.month:
+        table_df, money_cols, pct_cols = monthly_goal_frame(_df, _aggregates, job.month, positions)
+
+        def figure():
+            order = _aggregates.top_positions(job.month, niveles=None if job.nivel is None else [job.nivel])
+            names, values = _df["nombre"].to_numpy()[order], _df[f"volumen {job.month}"].to_numpy()[order]
+            labels, bar_values, colors = top_n_with_others(names, values, CHART_TOP_N)
+            return seller_bar_figure(labels, bar_values, f"Volumen {job.month.capitalize()}", colors)
+    else:
+        table_df, money_cols, pct_cols = annual_goal_frame(_df, positions)
+
+        def figure():
+            totals = _worker_queries().totals_by_nivel(None if job.nivel is None else [job.nivel])["total_volumen"].reset_index()
+            return px.pie(totals, names="nivel", values="total_volumen", title="")
+    return table_df.reset_index(), money_cols, pct_cols, figure
+
+
+def _chunks(table_df):
+    for start in range(0, len(table_df), CHUNK_ROWS):
+        yield table_df.iloc[start:start + CHUNK_ROWS]
+
+
+# --- Writers: each consumes the table chunk by chunk ---
+def _write_csv(path, job, table_df, money_cols, pct_cols, figure):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        csv.writer(fh).writerow(table_df.columns)
+        for chunk in _chunks(table_df):
+            chunk.to_csv(fh, header=False, index=False)
+
+
+def _write_xlsx(path, job, table_df, money_cols, pct_cols, figure):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(job.title[:31])
+    sheet.append(list(table_df.columns))
+    formats = {col: "$#,##0" for col in money_cols}
+    formats.update({col: '0.0"%"' for col in pct_cols})
+    column_formats = [formats.get(col) for col in table_df.columns]
+    for chunk in _chunks(table_df):
+        for values in chunk.itertuples(index=False):
+            row = []
+            for value, number_format in zip(values, column_formats):
+                if isinstance(value, float) and np.isnan(value):
+                    value = None
+                cell = WriteOnlyCell(sheet, value=value)
+                if number_format:
+                    cell.number_format = number_format
+                row.append(cell)
+            sheet.append(row)
+    workbook.save(path)
+
+
+def _write_html(path, job, table_df, money_cols, pct_cols, figure):
+    columns = list(table_df.columns)
+    money, pct = set(money_cols), set(pct_cols)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(f"<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>{html.escape(job.title)}</title>"
+                 "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+                 "td,th{border:1px solid #ddd;padding:4px 8px}td.n{text-align:right}</style></head><body>\n")
+        fh.write(f"<h1>{html.escape(job.title)}</h1>\n")
+        fh.write(figure().to_html(full_html=False, include_plotlyjs="cdn"))
+        fh.write("<table><thead><tr>" + "".join(f"<th>{html.escape(str(col))}</th>" for col in columns) + "</tr></thead><tbody>\n")
+        for chunk in _chunks(table_df):
+            # Colour bands computed per chunk, the same way as in the app
+            styles = {col: percentage_styles(chunk[col].to_numpy()) for col in pct_cols}
+            cells = []
+            for col in columns:
+                values = chunk[col].to_numpy()
+                if col in money:
+                    cells.append([f"<td class='n'>{'' if np.isnan(value) else f'${value:,.0f}'}</td>" for value in values])
+                elif col in pct:
+                    cells.append([
+                        f"<td class='n' style='{style}'>{'' if np.isnan(value) else f'{value:.1f}%'}</td>"
+                        for value, style in zip(values, styles[col])
+                    ])
+                else:
+                    cells.append([f"<td>{html.escape(str(value))}</td>" for value in values])
+            fh.writelines("<tr>" + "".join(row) + "</tr>\n" for row in zip(*cells))
+        fh.write("</tbody></table></body></html>\n")
+
+
+def _write_png(path, job, table_df, money_cols, pct_cols, figure):
+    figure().write_image(path)
+
+
+WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "html": _write_html, "png": _write_png}
+
+
+def run_job(job, path):
+    """Worker entry point: build one report and write it; returns (path, rows)."""
+    table_df, money_cols, pct_cols, figure = _report_frame(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{job.fmt}"
+    WRITERS[job.fmt](tmp_path, job, table_df, money_cols, pct_cols, figure)
+    os.replace(tmp_path, path)
+    return path, len(table_df)
+
+
+def plan_jobs(aggregates, months=None, formats=DEFAULT_FORMATS, by_nivel=True):
+    """Every (month or annual) x (all, each nivel) x format combination."""
+    months = aggregates.months if months is None else [month for month in months if month in aggregates.months]
+    niveles = [None] + (sorted(aggregates.niveles) if by_nivel else [])
+    return [ReportJob(month, nivel, fmt) for month in [*months, None] for nivel in niveles for fmt in formats]
+
+
+def export_reports(snapshot, output, months=None, formats=DEFAULT_FORMATS, by_nivel=True, workers=None):
+    """Write all reports for a DatasetSnapshot under `output`; returns [(path, rows)]."""
+    jobs = plan_jobs(snapshot.aggregates, months, formats, by_nivel)
+    written = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(snapshot.df, snapshot.volume_cols, snapshot.version),
+    ) as pool:
+        futures = [pool.submit(run_job, job, os.path.join(output, job.filename(snapshot.year))) for job in jobs]
+        for future in as_completed(futures):
+            written.append(future.result())
+    return sorted(written)
+
+
+def _check_formats(formats):
+    missing = {"xlsx": "openpyxl", "png": "kaleido"}
+    for fmt, module in missing.items():
+        if fmt in formats:
+            try:
+                __import__(module)
+            except ImportError:
+                raise SystemExit(f"El formato {fmt} requiere instalar {module} (pip install {module})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportar las tablas de metas mensuales y anuales.")
+    parser.add_argument("--source", help="Ruta CSV/Parquet o URL publicada (por defecto, la fuente configurada del dashboard)")
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS, choices=FORMATS)
+    parser.add_argument("--months", nargs="*", help="Meses a exportar (por defecto, todos los de la hoja)")
+    parser.add_argument("--no-nivel", action="store_true", help="No generar un archivo por nivel")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument("--output", default="reportes")
+    args = parser.parse_args(argv)
+    _check_formats(args.formats)
+
+    source = source_for_location(args.source) if args.source else source_from_config()
+    start = time.perf_counter()
+    snapshot = build_snapshot(source.fetch())
+    written = export_reports(snapshot, args.output, args.months, args.formats, not args.no_nivel, args.workers)
+    for path, rows in written:
+        print(f"{path}: {rows:,} filas")
+    print(f"{len(written)} archivos en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
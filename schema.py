@@ -0,0 +1,206 @@
+import csv
+import io
+import re
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import perf
+
+# --- Declared sheet schema ---
+# Published sheets use '$' and ',' as thousands separator, '.' for decimals
+CURRENCY_CHARS = r"[$\s,]"
+# Raw values kept per column as examples of coerced cells
+MAX_SAMPLES = 3
+
+MONTH_NAMES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+_MONTH_COL_RE = re.compile(r"^(volumen|compras)\s+([a-záéíóú]+)$")
+
+
+class SchemaError(ValueError):
+    """The sheet is missing columns the dashboard cannot work without."""
+
+
+@dataclass(frozen=True)
+class Column:
+    """One schema entry: a pattern over normalized column names."""
+
+    pattern: str
+    kind: str  # "text" | "money"
+    required: bool = False
+
+    def matches(self, name):
+        return re.fullmatch(self.pattern, name) is not None
+
+
+# First matching entry wins, so specific names go before the month pattern
+SHEET_SCHEMA = [
+    Column("nombre", "text", required=True),
+    Column("nivel", "text", required=True),
+    Column("region", "text"),
+    Column("meta mensual volumen", "money", required=True),
+    Column("meta compra mensual", "money", required=True),
+    Column(r"meta compras \d{4}", "money", required=True),
+    Column("volumen enero", "money", required=True),
+    Column("compras enero", "money", required=True),
+    Column(r"(volumen|compras) [a-záéíóú]+", "money"),
+]
+
+
+def normalize_column(name):
+    """Raw header -> schema name: trimmed, lowercase, single spaces."""
+    return " ".join(str(name).split()).lower()
+
+
+def month_column_parts(col):
+    """
+    Split a monthly column into (metric, month), tolerating truncated month
+    names such as 'compras octubr'. Returns None for other columns.
+    """
+    match = _MONTH_COL_RE.match(col)
+    if not match:
+        return None
+    metric, token = match.groups()
+    if token in MONTH_NAMES:
+        return metric, token
+    candidates = [month for month in MONTH_NAMES if len(token) >= 3 and month.startswith(token)]
+    return (metric, candidates[0]) if len(candidates) == 1 else None
+
+
+def canonical_month_names(columns):
+    """Rename map fixing truncated month names ('compras octubr' -> 'compras octubre')."""
+    renames = {}
+    for col in columns:
+        parts = month_column_parts(col)
+        if parts:
+            canonical = f"{parts[0]} {parts[1]}"
+            if canonical != col and canonical not in columns:
+                renames[col] = canonical
+    return renames
+
+
+def column_spec(name, schema=SHEET_SCHEMA):
+    """Schema entry for a normalized column name, or None if undeclared."""
+    return next((column for column in schema if column.matches(name)), None)
+
+
+@dataclass
+class ValidationReport:
+    """What the ingest had to fix or could not find, per load."""
+
+    rows: int = 0
+    missing_columns: list = field(default_factory=list)
+    renamed_columns: dict = field(default_factory=dict)
+    unexpected_columns: list = field(default_factory=list)
+    # {column: {"missing": n, "coerced": n, "samples": [...]}}, only columns with issues
+    cells: dict = field(default_factory=dict)
+
+    @property
+    def coerced_cells(self):
+        return sum(entry["coerced"] for entry in self.cells.values())
+
+    @property
+    def missing_cells(self):
+        return sum(entry["missing"] for entry in self.cells.values())
+
+    @property
+    def ok(self):
+        # Renamed columns were fixed automatically; they only show in summary()
+        return not (self.missing_columns or self.coerced_cells)
+
+    def summary(self):
+        """One log line; empty when there is nothing to report."""
+        parts = []
+        if self.missing_columns:
+            parts.append(f"missing columns {self.missing_columns}")
+        if self.renamed_columns:
+            parts.append(f"renamed {self.renamed_columns}")
+        if self.coerced_cells:
+            coerced = {col: entry["samples"] for col, entry in self.cells.items() if entry["coerced"]}
+            parts.append(f"{self.coerced_cells} unparseable cells set to 0 {coerced}")
+        return "; ".join(parts)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def check_columns(columns, report, expected=(), schema=SHEET_SCHEMA):
+    """
+    Check normalized `columns` against the schema. Raises SchemaError when a
+    required column is absent; optional `expected` names and undeclared
+    columns are only recorded in the report.
+    """
+    missing_required = [
+        column.pattern for column in schema
+        if column.required and not any(column.matches(name) for name in columns)
+    ]
+    if missing_required:
+        raise SchemaError(f"Sheet is missing required columns: {missing_required}")
+    report.missing_columns = [name for name in expected if name not in columns]
+    report.unexpected_columns = [name for name in columns if column_spec(name, schema) is None]
+    return report
+
+
+def parse_money(values):
+    """
+    Vectorized money parsing ('$1,234.50' -> 1234.5). Returns
+    (float64 array, missing mask, coerced mask); NaN where the cell is empty
+    or unparseable.
+    """
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(numbers)
+        return numbers, missing, np.zeros(len(numbers), dtype=bool)
+    text = values.astype("string").str.replace(CURRENCY_CHARS, "", regex=True)
+    missing = (text.isna() | (text == "") | (text == "-")).to_numpy(dtype=bool)
+    numbers = pd.to_numeric(text.mask(missing), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return numbers, missing, np.isnan(numbers) & ~missing
+
+
+def coerce_numeric(df, columns, report):
+    """
+    Parse `columns` of `df` as money in place, filling empty and
+    unparseable cells with 0 and counting both in `report`.
+    """
+    for col in columns:
+        numbers, missing, coerced = parse_money(df[col])
+        n_missing, n_coerced = int(missing.sum()), int(coerced.sum())
+        if n_missing or n_coerced:
+            samples = df[col].to_numpy()[coerced][:MAX_SAMPLES]
+            report.cells[col] = {"missing": n_missing, "coerced": n_coerced, "samples": [str(value) for value in samples]}
+        df[col] = np.nan_to_num(numbers, nan=0.0)
+    report.rows = len(df)
+    perf.count("schema.cells.missing", report.missing_cells)
+    perf.count("schema.cells.coerced", report.coerced_cells)
+    return df
+
+
+# --- Typed CSV ingest ---
+def _header(data):
+    end = data.find(b"\n")
+    first_line = data if end < 0 else data[:end]
+    return next(csv.reader(io.StringIO(first_line.decode("utf-8-sig"))), [])
+
+
+def read_sheet_csv(data, schema=SHEET_SCHEMA):
+    """
+    Parse the sheet CSV in one typed pass with pyarrow: text columns as
+    strings, money columns as float64. If a money column holds currency
+    formatting or junk, money columns are re-read as strings and left to
+    coerce_numeric(), which parses and reports them.
+    """
+    types = {}
+    for name in _header(data):
+        column = column_spec(normalize_column(name), schema)
+        if column is not None:
+            types[name] = pa.string() if column.kind == "text" else pa.float64()
+    try:
+        table = pa_csv.read_csv(pa.py_buffer(data), convert_options=pa_csv.ConvertOptions(column_types=types))
+    except pa.ArrowInvalid:
+        perf.count("schema.csv.slow_path")
+        text_types = {name: pa.string() for name in types}
+        table = pa_csv.read_csv(pa.py_buffer(data), convert_options=pa_csv.ConvertOptions(column_types=text_types))
+    return table.to_pandas()
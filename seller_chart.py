@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+import perf
+from figure_cache import cached_figure
+from fragments import fragment
+
+TOP_N_OPTIONS = [10, 20, 30, 50]
+PAGE_SIZE = 25
+ROW_HEIGHT = 24
+OTHERS_COLOR = "#adb5bd"
+BAR_COLOR = "#636efa"
+
+
+def rank_marks(deltas):
+    """Movement arrows for month-over-month rank changes ('▲2', '▼1', '' when unchanged)."""
+    if deltas is None:
+        return None
+    deltas = np.asarray(deltas)
+    magnitude = np.abs(deltas).astype(str)
+    return np.where(deltas > 0, np.char.add(" ▲", magnitude), np.where(deltas < 0, np.char.add(" ▼", magnitude), ""))
+
+
+def top_n_with_others(names, values, n, marks=None):
+    """
+    First `n` entries of an already ranked roster plus one 'Otros' bucket
+    summing the rest. `marks` (see rank_marks) are appended to the labels.
+    Returns (labels, values, colors).
+    """
+    marks = [""] * min(n, len(names)) if marks is None else marks[:n]
+    labels = [f"{rank}. {name}{mark}" for rank, (name, mark) in enumerate(zip(names[:n], marks), start=1)]
+    bar_values = values[:n].tolist()
+    colors = [BAR_COLOR] * len(labels)
+    if len(names) > n:
+        labels.append(f"Otros ({len(names) - n:,} vendedores)")
+        bar_values.append(float(values[n:].sum()))
+        colors.append(OTHERS_COLOR)
+    return labels, bar_values, colors
+
+
+def page_window(n_items, page, page_size=PAGE_SIZE):
+    """(start, stop) slice of a 1-based page, clamped to the roster."""
+    n_pages = max(1, -(-n_items // page_size))
+    page = min(max(1, page), n_pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_items), n_pages
+
+
+def seller_bar_figure(names, values, label, colors=None):
+    """Horizontal go.Bar for a small, already ranked window (best seller on top)."""
+    fig = go.Figure(go.Bar(
+        x=values,
+        y=names,
+        orientation="h",
+        text=values,
+        texttemplate="$%{text:,.2f}",
+        textposition="outside",
+        textfont=dict(color="black"),
+        marker_color=colors or BAR_COLOR,
+        hovertemplate="%{y}: $%{x:,.2f}<extra></extra>",
+    ))
+    fig.update_layout(
+        xaxis_title=label,
+        yaxis={"autorange": "reversed", "tickfont": {"color": "black"}, "type": "category"},
+        margin=dict(l=20, r=20, t=20, b=20),
+        height=max(400, len(names) * ROW_HEIGHT),
+    )
+    return fig
+
+
+@fragment
+def render_seller_ranking(df, order, value_col, label, key="ranking", cache_key=None, deltas=None):
+    """
+    Seller ranking with bounded payload: either Top N plus an 'Otros' bucket,
+    or one searchable page of the full ranking. `order` holds the row
+    positions of `df` already sorted best first, so nothing is re-sorted here.
+    `deltas` (aligned with `order`) adds rank-movement arrows to the labels.
+    `cache_key` = (version, page, niveles, month) enables the shared figure cache.
+    A fragment: its own widgets (view, N, search, page) rerun only the ranking.
+    """
+    version, page_name, niveles, month = cache_key or (None, key, None, None)
+    names = df["nombre"].to_numpy()[order]
+    values = df[value_col].to_numpy()[order]
+    ranks = np.arange(1, len(order) + 1)
+    marks = rank_marks(deltas)
+    if marks is None:
+        marks = np.full(len(order), "")
+
+    col_mode, col_option = st.columns([1, 2])
+    with col_mode:
+        mode = st.radio("Vista", ["Top N", "Lista completa"], horizontal=True, key=f"{key}_mode")
+
+    if mode == "Top N":
+        with col_option:
+            n = st.select_slider("Vendedores a mostrar", TOP_N_OPTIONS, value=TOP_N_OPTIONS[1], key=f"{key}_n")
+
+        def build_top_n_figure():
+            labels, bar_values, colors = top_n_with_others(names, values, n, marks)
+            return seller_bar_figure(labels, bar_values, label, colors)
+
+        with perf.span("seller_chart.top_n"):
+            fig = cached_figure(version, page_name, niveles, month, build_top_n_figure, "top", n)
+        st.plotly_chart(fig, width='stretch')
+        return
+
+    with col_option:
+        query = st.text_input("Buscar vendedor", key=f"{key}_query").strip()
+    if query:
+        matches = pd.Series(names).str.contains(query, case=False, regex=False).to_numpy()
+        names, values, ranks, marks = names[matches], values[matches], ranks[matches], marks[matches]
+    if len(names) == 0:
+        st.info("Ningún vendedor coincide con la búsqueda.")
+        return
+
+    n_pages = page_window(len(names), 1)[2]
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        # A narrower search or nivel filter can leave the stored page out of range
+        st.session_state[f"{key}_page"] = 1
+    page = st.number_input(f"Página (de {n_pages:,})", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+    start, stop, _ = page_window(len(names), int(page))
+
+    def build_page_figure():
+        labels = [f"{rank}. {name}{mark}" for rank, name, mark in zip(ranks[start:stop], names[start:stop], marks[start:stop])]
+        return seller_bar_figure(labels, values[start:stop].tolist(), label)
+
+    with perf.span("seller_chart.page"):
+        fig = cached_figure(version, page_name, niveles, month, build_page_figure, "page", query.lower(), start)
+    st.caption(f"Mostrando {start + 1:,}–{stop:,} de {len(names):,} vendedores")
+    st.plotly_chart(fig, width='stretch')
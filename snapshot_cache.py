@@ -0,0 +1,70 @@
+import hashlib
+import json
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DASHBOARD_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+METADATA_KEY = b"dashboard"
+FORMAT_VERSION = 1
+
+
+class SnapshotStore:
+    """
+    On-disk Parquet copy of the processed dataset, one file per source.
+    The file carries the column lists and a content hash of the raw source,
+    so a restart can serve it immediately and skip re-processing when the
+    source has not changed.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = os.path.join(directory, "snapshots")
+
+    def path_for(self, source_key):
+        name = hashlib.sha1(source_key.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.parquet")
+
+    def save(self, source_key, snapshot):
+        """Write the snapshot atomically; failures are logged, never raised."""
+        path = self.path_for(source_key)
+        meta = {
+            "format": FORMAT_VERSION,
+            "source_key": source_key,
+            "source_hash": snapshot.source_hash,
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at,
+            "sales_cols": snapshot.sales_cols,
+            "purchase_cols": snapshot.purchase_cols,
+            "volume_cols": snapshot.volume_cols,
+            "validation": snapshot.validation.as_dict(),
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            table = pa.Table.from_pandas(snapshot.df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(meta).encode()})
+            tmp_path = f"{path}.tmp"
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as exc:
+            logger.warning("Could not write snapshot cache %s: %s", path, exc)
+
+    def load(self, source_key):
+        """Return (df, metadata) for the source, or None if missing/unreadable."""
+        path = self.path_for(source_key)
+        if not os.path.exists(path):
+            return None
+        try:
+            table = pq.read_table(path, memory_map=True)
+            meta = json.loads(table.schema.metadata[METADATA_KEY])
+            if meta.get("format") != FORMAT_VERSION or meta.get("source_key") != source_key:
+                return None
+            return table.to_pandas(), meta
+        except Exception as exc:
+            logger.warning("Ignoring unreadable snapshot cache %s: %s", path, exc)
+            return None
@@ -0,0 +1,27 @@
+import os
+import re
+from functools import lru_cache
+
+import streamlit as st
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "dashboard.css")
+
+
+@lru_cache(maxsize=1)
+def dashboard_css():
+    """Shared stylesheet, read once per process and minified."""
+    with open(CSS_PATH, encoding="utf-8") as fh:
+        css = fh.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>+])\s*", r"\1", css)
+    return f"<style>{css.strip()}</style>"
+
+
+def inject_css():
+    """
+    Send the shared stylesheet. Style-only st.html goes to Streamlit's event
+    container, so it takes no layout space; call it once per rerun from app.py
+    instead of from every page.
+    """
+    st.html(dashboard_css())
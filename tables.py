@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import perf
+from data_processing import annual_goal_column
+
+# Display formats applied by the frontend (values stay numeric)
+MONEY_FORMAT = "$%,.0f"
+PERCENT_FORMAT = "%.1f%%"
+
+# Background colours for goal attainment bands
+LOW_STYLE = "background-color: #ffcccc"  # Light red, < 50%
+MID_STYLE = "background-color: #ffffcc"  # Light yellow, < 100%
+HIGH_STYLE = "background-color: #ccffcc"  # Light green, >= 100%
+
+
+def percentage_styles(values):
+    """Vectorized CSS for attainment percentages (missing values get no colour)."""
+    values = np.asarray(values, dtype=float)
+    return np.select(
+        [np.isnan(values), values < 50, values < 100],
+        ["", LOW_STYLE, MID_STYLE],
+        default=HIGH_STYLE,
+    )
+
+
+def _band_styles(frame):
+    return pd.DataFrame(percentage_styles(frame.to_numpy()), index=frame.index, columns=frame.columns)
+
+
+def goal_table(table_df, money_cols, pct_cols):
+    """
+    Build the Styler and column config for a numeric goals table.
+    Colours are computed in one vectorized pass over the raw ratios and
+    formatting is left to the column config, so no per-cell Python runs.
+    Tables above pandas' Styler cell limit are returned unstyled.
+    """
+    if table_df.size > pd.get_option("styler.render.max_elements"):
+        perf.count("table.unstyled")
+        styler = table_df
+    else:
+        styler = table_df.style.apply(_band_styles, axis=None, subset=list(pct_cols))
+    column_config = {col: st.column_config.NumberColumn(col, format=MONEY_FORMAT) for col in money_cols}
+    column_config.update({col: st.column_config.NumberColumn(col, format=PERCENT_FORMAT) for col in pct_cols})
+    return styler, column_config
+
+
+def row_labels(df):
+    """Index columns for goal tables: the seller, prefixed by region on merged sheets."""
+    return ["region", "nombre"] if "region" in df.columns else ["nombre"]
+
+
+def _display_slice(df, positions, columns):
+    """
+    Only the displayed rows and columns of the shared dataset, copied in a
+    single take; the full-width frame is never duplicated.
+    """
+    labels = row_labels(df)
+    rows = slice(None) if positions is None else positions
+    return df.iloc[rows, df.columns.get_indexer(labels + columns)].set_index(labels)
+
+
+def monthly_goal_frame(df, aggregates, month, positions=None, forecast=None):
+    """
+    Numeric goals table for one month: (table_df, money_cols, pct_cols).
+    `positions` selects rows of `df` (all rows if None); percentages come
+    from the precomputed goal ratios. With a Forecast, projected attainment
+    columns are appended.
+    """
+    if positions is None:
+        positions = np.arange(len(df))
+    month_idx = aggregates.months.index(month)
+    volume_col, purchase_col = f"volumen {month}", f"compras {month}"
+    volume_pct_col, purchase_pct_col = f"% Meta Volumen {month}", f"% Meta Compras {month}"
+    table_df = _display_slice(df, positions, ["nivel", "meta mensual volumen", volume_col, "meta compra mensual", purchase_col])
+    table_df.insert(3, volume_pct_col, aggregates.volume_ratio[positions, month_idx])
+    table_df[purchase_pct_col] = aggregates.purchase_ratio[positions, month_idx]
+    pct_cols = [volume_pct_col, purchase_pct_col]
+    if forecast is not None:
+        projected = forecast.month_attainment(month, positions)
+        for col, values in projected.items():
+            table_df[col] = values
+        pct_cols += list(projected)
+    return table_df, ["meta mensual volumen", volume_col, "meta compra mensual", purchase_col], pct_cols
+
+
+def annual_goal_frame(df, positions=None, forecast=None):
+    """
+    Numeric annual goals table for rows `positions` of df: (table_df, money_cols, pct_cols).
+    With a Forecast, projected end-of-year attainment columns are appended.
+    """
+    annual_goal_col = annual_goal_column(df.columns)
+    table_df = _display_slice(df, positions, [
+        "nivel", "meta mensual volumen", "total_volumen", "% Meta Volumen Anual",
+        annual_goal_col, "total_compras", "% Meta Compras Anual",
+    ])
+    pct_cols = ["% Meta Volumen Anual", "% Meta Compras Anual"]
+    if forecast is not None:
+        projected = forecast.annual_attainment(positions)
+        for col, values in projected.items():
+            table_df[col] = values
+        pct_cols += list(projected)
+    return table_df, ["meta mensual volumen", "total_volumen", annual_goal_col, "total_compras"], pct_cols
+
+
+def render_goal_table(table_df, money_cols, pct_cols):
+    """Display a numeric goals table; money/percentage formats and colour bands are vectorized."""
+    hide_index = False
+    if not table_df.index.is_unique:
+        # The Styler needs unique row labels; repeated names become plain columns
+        table_df, hide_index = table_df.reset_index(), True
+    with perf.span("table.style"):
+        styler, column_config = goal_table(table_df, money_cols, pct_cols)
+    with perf.span("table.serialize"):
+        st.dataframe(styler, column_config=column_config, hide_index=hide_index)
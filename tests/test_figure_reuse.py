@@ -0,0 +1,74 @@
+"""
+Which figures of the monthly page are rebuilt or served from the shared
+figure cache per widget change, from the 'recompute.*' counters that
+figure_cache.cached_figure keeps. AppTest reruns the whole script on every
+widget change, so this does not cover fragment-scoped reruns.
+"""
+import os
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+FIGURES = ["recompute.monthly.ranking", "recompute.monthly.trend"]
+
+
+@pytest.fixture(scope="module")
+def environment(tmp_path_factory):
+    # Set before app.py first imports snapshot_cache, which reads the cache dir at import time
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DASHBOARD_SOURCE", "fixture")
+        monkeypatch.setenv("DASHBOARD_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        # No background refresh during the test
+        monkeypatch.setenv("DASHBOARD_REFRESH_SECONDS", "86400")
+        monkeypatch.delenv("DASHBOARD_API_PORT", raising=False)
+        yield
+
+
+@pytest.fixture
+def app(environment):
+    from streamlit.testing.v1 import AppTest
+    from figure_cache import figure_cache
+
+    # Start from an empty figure cache so every month selected below is a first visit
+    figure_cache.invalidate()
+    app = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    assert not app.exception
+    next(button for button in app.button if button.label == "📆 Mensual").click().run()
+    assert not app.exception
+    return app
+
+
+def recomputed(interaction):
+    """recompute.* counter deltas for the monthly figures caused by `interaction`."""
+    import perf
+
+    before = perf.stats()["counters"]
+    interaction()
+    after = perf.stats()["counters"]
+    return {name: after.get(name, 0) - before.get(name, 0) for name in FIGURES}
+
+
+def widget(widgets, label):
+    return next(item for item in widgets if item.label == label)
+
+
+def test_month_change_reuses_trend_figure(app):
+    month = widget(app.selectbox, "Seleccionar Mes")
+    assert len(month.options) > 1
+    deltas = recomputed(lambda: month.select_index(1).run())
+    assert not app.exception
+    assert deltas == {
+        "recompute.monthly.ranking": 1,
+        "recompute.monthly.trend": 0,
+    }
+
+
+def test_nivel_change_rebuilds_trend_figure(app):
+    niveles = widget(app.multiselect, "Seleccionar Nivel")
+    assert len(niveles.options) > 1
+    deltas = recomputed(lambda: niveles.unselect(niveles.options[0]).run())
+    assert not app.exception
+    assert deltas == {
+        "recompute.monthly.ranking": 1,
+        "recompute.monthly.trend": 1,
+    }
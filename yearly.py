@@ -1,131 +1,81 @@
 import streamlit as st
 import plotly.express as px
+import perf
+from data_processing import build_aggregates
+from figure_cache import cached_figure
+from forecasting import forecast_for
+from fragments import fragment
+from query_engine import QueryEngine
+from tables import annual_goal_frame, render_goal_table
 
-# Custom CSS for shadows and styling
-shadow_css = """
-<style>
-/* Aggressive background color application */
-html, body, #root, .stApp, [data-testid="stApp"], [data-testid="stAppViewContainer"] {
-    background-color: #e9ecef !important;
-    background: #e9ecef !important;
-}
-
-/* Override any Streamlit default backgrounds */
-.stApp > * {
-    background-color: transparent !important;
-}
-
-/* Light gray background for the main container */
-.main .block-container {
-    background-color: #e9ecef !important;
-    padding: 2rem 1rem;
-}
-
-/* Shadow effects for different sections */
-[data-testid="stVerticalBlock"] > [data-testid="column"] {
-    background-color: white;
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04);
-    padding: 20px;
-    margin: 10px 0;
-    border: 1px solid #e9ecef;
-}
-
-[data-testid="stVerticalBlock"] > div:has([data-testid="stMarkdownContainer"]) + div:has([data-testid="stPlotlyChart"]) {
-    background-color: white;
-    border-radius: 12px;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04);
-    padding: 20px;
-    margin: 15px 0;
-    border: 1px solid #e9ecef;
-}
-
-[data-testid="stDataFrame"] {
-    background-color: white !important;
-    border-radius: 12px !important;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04) !important;
-    border: 1px solid #e9ecef !important;
-    overflow: hidden !important;
-}
-
-[data-testid="stPlotlyChart"] > div {
-    background-color: white !important;
-    border-radius: 12px !important;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08), 0 2px 4px rgba(0, 0, 0, 0.04) !important;
-    border: 1px solid #e9ecef !important;
-}
-
-/* Metric cards styling */
-[data-testid="stMetric"] {
-    background-color: white !important;
-    border-radius: 10px !important;
-    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06), 0 1px 2px rgba(0, 0, 0, 0.04) !important;
-    padding: 15px !important;
-    margin: 8px !important;
-    border: 1px solid #e9ecef !important;
-}
-
-/* Title styling */
-h1, h2, h3 {
-    color: #2c3e50 !important;
-    font-weight: 600 !important;
-}
-</style>
-"""
-
-def render(df, sales_cols, purchase_cols, volume_cols, purchase_cols_list):
-    # Apply custom CSS
-    st.markdown(shadow_css, unsafe_allow_html=True)
-    
+def render(df, sales_cols, purchase_cols, volume_cols, purchase_cols_list, aggregates=None, history=None, queries=None):
     st.title("📈 Resumen Anual")
+    if aggregates is None:
+        aggregates = build_aggregates(df, volume_cols)
+    if queries is None:
+        queries = QueryEngine(df, aggregates.version)
+    render_sections(df, aggregates, history, queries)
+
 
+# Changing the nivel filter reruns only this fragment, not app.py
+@fragment
+def render_sections(df, aggregates, history, queries):
     # --- Filter by Nivel ---
     niveles = df["nivel"].unique().tolist()
     selected_niveles = st.multiselect("Seleccionar Nivel", niveles, default=niveles)
-    df_filtered = df[df["nivel"].isin(selected_niveles)]
+    # Row positions into the shared dataset; only the table slice is materialized
+    filtered_positions = queries.seller_rows(selected_niveles)
 
     # --- Sales by Nivel ---
     st.subheader("💰 Ventas por Nivel")
-    df_grouped = df_filtered.groupby("nivel")["total_volumen"].sum().reset_index()
-    fig = px.pie(df_grouped, names="nivel", values="total_volumen", title="")
-    fig.update_layout(margin=dict(l=20, r=20, t=20, b=20))
+    def build_pie_figure():
+        df_grouped = queries.totals_by_nivel(selected_niveles)["total_volumen"].reset_index()
+        fig = px.pie(df_grouped, names="nivel", values="total_volumen", title="")
+        fig.update_layout(margin=dict(l=20, r=20, t=20, b=20))
+        return fig
+
+    with perf.span("yearly.pie"):
+        fig = cached_figure(aggregates.version, "yearly.pie", selected_niveles, None, build_pie_figure)
     st.plotly_chart(fig, width='stretch')
 
+    # --- Year over Year (history store) ---
+    if history is not None:
+        yearly_totals = history.yearly_totals(niveles=selected_niveles)
+        if yearly_totals["year"].nunique() > 1:
+            st.subheader("📅 Comparativo Anual")
+            # Cached by the history store: relabel a copy
+            yearly_totals = yearly_totals.assign(year=yearly_totals["year"].astype(str))
+
+            def build_yoy_figure():
+                fig = px.bar(yearly_totals, x="year", y="value", color="nivel", title="",
+                             labels={"year": "Año", "value": "Volumen Total", "nivel": "Nivel"})
+                fig.update_layout(margin=dict(l=20, r=20, t=20, b=20))
+                return fig
+
+            # History years are keyed in too: an import adds bars without a new sheet version
+            years = tuple(yearly_totals["year"].unique())
+            fig = cached_figure(aggregates.version, "yearly.yoy", selected_niveles, None, build_yoy_figure, years)
+            st.plotly_chart(fig, width='stretch')
+
+    # --- Projected year end by Nivel ---
+    forecast = forecast_for(df, aggregates)
+    st.subheader("🔮 Proyección al Cierre del Año")
+    projection = forecast.by_nivel(selected_niveles)
+    render_goal_table(
+        projection.rename(columns={
+            "proyeccion_volumen": "Volumen Proyectado", "tendencia_volumen": "Volumen Tendencia",
+            "meta_volumen": "Meta Volumen Anual", "proyeccion_compras": "Compras Proyectadas",
+            "meta_compras": "Meta Compras Anual",
+        }),
+        money_cols=["Volumen Proyectado", "Volumen Tendencia", "Meta Volumen Anual", "Compras Proyectadas", "Meta Compras Anual"],
+        pct_cols=[col for col in projection.columns if col.startswith("%")],
+    )
+    st.caption("Proyección: ritmo del año hasta hoy (el mes en curso se extrapola por los días transcurridos). "
+               "Tendencia: recta ajustada a los meses cerrados de cada vendedor.")
+
     # --- Goals vs Actual ---
     st.subheader("🎯 Metas Anuales y Rendimiento")
-    table_df = df_filtered[["nombre", "nivel", "meta mensual volumen", "total_volumen", "% Meta Volumen Anual", "meta compras 2026", "total_compras", "% Meta Compras Anual"]].copy()
-    
-    # Format monetary columns with $ sign
-    import pandas as pd
-    table_df["meta mensual volumen"] = table_df["meta mensual volumen"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df["total_volumen"] = table_df["total_volumen"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df["meta compras 2026"] = table_df["meta compras 2026"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    table_df["total_compras"] = table_df["total_compras"].apply(lambda x: f"${x:,.0f}" if pd.notna(x) else x)
-    
-    # Format percentage columns with % sign
-    table_df["% Meta Volumen Anual"] = table_df["% Meta Volumen Anual"].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else x)
-    table_df["% Meta Compras Anual"] = table_df["% Meta Compras Anual"].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else x)
-    
-    # Set index
-    table_df = table_df.set_index("nombre")
-    
-    # Apply conditional styling for percentage columns
-    def style_percentages(val):
-        if isinstance(val, str) and '%' in val:
-            try:
-                # Extract numeric value from percentage string
-                pct = float(val.replace('%', ''))
-                if pct < 50:
-                    return 'background-color: #ffcccc'  # Light red
-                elif pct < 100:
-                    return 'background-color: #ffffcc'  # Light yellow
-                else:
-                    return 'background-color: #ccffcc'  # Light green
-            except ValueError:
-                return ''
-        return ''
-    
-    # Apply styling to the dataframe
-    styled_df = table_df.style.map(style_percentages, subset=["% Meta Volumen Anual", "% Meta Compras Anual"])
-    
-    st.dataframe(styled_df)
+    perf.count("recompute.yearly.table")
+    table_df, money_cols, pct_cols = annual_goal_frame(df, filtered_positions, forecast)
+
+    render_goal_table(table_df, money_cols=money_cols, pct_cols=pct_cols)